@@ -0,0 +1,242 @@
+# Cohort report for operators: where users drop off in the 21 days, how
+# retention differs by the week they started, how much they write for each
+# principle and how close to their chosen journal_time they save.
+#
+#   python analytics.py [--json report.json] [--chunk 100000]
+#
+# users and journals are streamed in chunks of a few numeric columns and
+# folded into fixed-size numpy counters, so memory stays flat however large
+# the tables get. Each shard is scanned in parallel and the counters summed.
+import argparse
+import functools
+import json
+import sys
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+import content
+import db
+import schedule
+import shards
+
+DAYS = content.TOTAL_DAYS
+MAX_WORDS = 2000  # longer entries are counted in the last bucket
+MILESTONES = (1, 7, 14, 21)
+
+# Start date as days since 1970-01-01, and the user's current day
+SQL_USER_COHORTS = """SELECT CAST(julianday(start_date) - 2440587.5 AS INTEGER), current_day FROM users
+                      WHERE start_date IS NOT NULL"""
+# Each user's timezone gets a small number in a temporary table, so entry
+# rows can carry it as a numeric column
+SQL_CREATE_ZONES = "CREATE TEMP TABLE report_zones (id INTEGER PRIMARY KEY, name TEXT UNIQUE)"
+SQL_FILL_ZONES = "INSERT INTO temp.report_zones (name) SELECT DISTINCT coalesce(timezone, ?) FROM users"
+SQL_ZONES = "SELECT id, name FROM temp.report_zones"
+SQL_DROP_ZONES = "DROP TABLE IF EXISTS temp.report_zones"
+# Day, word count, save time, the user's journal_time in minutes after
+# midnight, and their timezone's id
+SQL_ENTRY_FACTS = """SELECT j.day, coalesce(j.words, 0), coalesce(j.saved_at, -1),
+                            coalesce(CAST(substr(u.journal_time, 1, 2) AS INTEGER) * 60
+                                     + CAST(substr(u.journal_time, 4, 2) AS INTEGER), -1),
+                            coalesce(z.id, -1)
+                     FROM journals j JOIN users u ON u.email = j.email
+                     LEFT JOIN temp.report_zones z ON z.name = coalesce(u.timezone, ?)"""
+
+
+def _chunks(conn, sql, chunk_size, params=()):
+    cursor = conn.execute(sql, params)
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield np.array(rows, dtype=np.int64).reshape(-1, len(cursor.description))
+
+
+# UTC offset in seconds of `timezone` at each of the Unix times in
+# `timestamps`. Offsets only change on the hour, so each distinct hour is
+# looked up once.
+def utc_offsets(timestamps, timezone):
+    hours, index = np.unique(timestamps // 3600, return_inverse=True)
+    offsets = np.fromiter((_hour_offset(timezone, hour) for hour in hours.tolist()), np.int64, len(hours))
+    return offsets[index]
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def _hour_offset(timezone, hour):
+    return int(datetime.fromtimestamp(hour * 3600, schedule.zone(timezone)).utcoffset().total_seconds())
+
+
+class CohortReport:
+    # Users without a timezone are taken to be in default_timezone; saved_at is
+    # turned into the local time of day that journal_time is expressed in
+    def __init__(self, default_timezone=None):
+        self.default_timezone = default_timezone or schedule.DEFAULT_TIMEZONE
+        # users by current_day; DAYS + 1 means the cycle is complete
+        self.current_day = np.zeros(DAYS + 2, np.int64)
+        # start week (weeks since Monday 1970-01-05) -> users by current_day
+        self.cohorts = {}
+        self.entries = np.zeros(DAYS + 1, np.int64)
+        self.words = np.zeros(DAYS + 1, np.int64)
+        self.word_histogram = np.zeros((DAYS + 1, MAX_WORDS + 1), np.int64)
+        # journal_time minute -> saves by hours before (-12) or after (+11) it
+        self.save_offsets = np.zeros((24 * 60, 24), np.int64)
+
+    def add_users(self, chunk):
+        start_day, current_day = chunk[:, 0], np.clip(chunk[:, 1], 1, DAYS + 1)
+        self.current_day += np.bincount(current_day, minlength=DAYS + 2)
+        weeks, index = np.unique((start_day - 4) // 7, return_inverse=True)
+        counts = np.bincount(index * (DAYS + 2) + current_day,
+                             minlength=len(weeks) * (DAYS + 2)).reshape(len(weeks), DAYS + 2)
+        for week, row in zip(weeks.tolist(), counts):
+            if week in self.cohorts:
+                self.cohorts[week] += row
+            else:
+                self.cohorts[week] = row
+
+    # zones maps the chunk's timezone ids (column 4) to timezone names
+    def add_entries(self, chunk, zones):
+        day = np.clip(chunk[:, 0], 0, DAYS)
+        words = np.clip(chunk[:, 1], 0, None)
+        self.entries += np.bincount(day, minlength=DAYS + 1)
+        self.words += np.bincount(day, weights=words, minlength=DAYS + 1).astype(np.int64)
+        self.word_histogram += np.bincount(day * (MAX_WORDS + 1) + np.minimum(words, MAX_WORDS),
+                                           minlength=(DAYS + 1) * (MAX_WORDS + 1)).reshape(DAYS + 1, -1)
+        saved_at, slot, zone = chunk[:, 2], chunk[:, 3], chunk[:, 4]
+        timed = (saved_at >= 0) & (slot >= 0) & (slot < 24 * 60)
+        saved_at, slot, zone = saved_at[timed], slot[timed], zone[timed]
+        local = saved_at.copy()
+        for zone_id in np.unique(zone).tolist():
+            in_zone = zone == zone_id
+            local[in_zone] += utc_offsets(saved_at[in_zone], zones.get(zone_id, self.default_timezone))
+        saved_minute = local // 60 % (24 * 60)
+        offset = (saved_minute - slot + 12 * 60) % (24 * 60)  # 0 .. 1439, 720 = on the minute
+        self.save_offsets += np.bincount(slot * 24 + offset // 60,
+                                         minlength=24 * 60 * 24).reshape(24 * 60, 24)
+
+    def merge(self, other):
+        self.current_day += other.current_day
+        for week, row in other.cohorts.items():
+            self.cohorts[week] = self.cohorts.get(week, 0) + row
+        self.entries += other.entries
+        self.words += other.words
+        self.word_histogram += other.word_histogram
+        self.save_offsets += other.save_offsets
+        return self
+
+    def scan(self, conn, chunk_size=100000):
+        for chunk in _chunks(conn, SQL_USER_COHORTS, chunk_size):
+            self.add_users(chunk)
+        conn.execute(SQL_DROP_ZONES)
+        conn.execute(SQL_CREATE_ZONES)
+        try:
+            conn.execute(SQL_FILL_ZONES, (self.default_timezone,))
+            zones = dict(conn.execute(SQL_ZONES).fetchall())
+            for chunk in _chunks(conn, SQL_ENTRY_FACTS, chunk_size, (self.default_timezone,)):
+                self.add_entries(chunk, zones)
+        finally:
+            conn.execute(SQL_DROP_ZONES)
+        return self
+
+    def summary(self):
+        # reached[d] = users who have got to day d or beyond
+        reached = np.cumsum(self.current_day[::-1])[::-1]
+        users = int(reached[1]) if len(reached) > 1 else 0
+        funnel = [{"day": day, "principle": content.get_day(day).principle, "reached": int(reached[day]),
+                   "reached_pct": _pct(reached[day], users), "saved": int(self.entries[day])}
+                  for day in range(1, DAYS + 1)]
+        funnel.append({"day": DAYS + 1, "principle": "completed", "reached": int(reached[DAYS + 1]),
+                       "reached_pct": _pct(reached[DAYS + 1], users), "saved": 0})
+
+        cohorts = []
+        for week in sorted(self.cohorts):
+            row = self.cohorts[week]
+            size = int(row.sum())
+            past = np.cumsum(row[::-1])[::-1]  # past[d] = users on day d or later
+            cohorts.append({"week": (date(1970, 1, 5) + timedelta(weeks=week)).isoformat(), "users": size,
+                            **{f"day{day}_pct": _pct(past[day + 1], size) for day in MILESTONES}})
+
+        words = []
+        cumulative = np.cumsum(self.word_histogram, axis=1)
+        for day in range(1, DAYS + 1):
+            count = int(self.entries[day])
+            words.append({"day": day, "principle": content.get_day(day).principle, "entries": count,
+                          "mean": round(self.words[day] / count, 1) if count else None,
+                          **{f"p{q}": _quantile(cumulative[day], q) for q in (25, 50, 90)}})
+
+        timing = []
+        for slot in np.flatnonzero(self.save_offsets.sum(axis=1)).tolist():
+            row = self.save_offsets[slot]
+            total = int(row.sum())
+            timing.append({"journal_time": f"{slot // 60:02d}:{slot % 60:02d}", "entries": total,
+                           "before_pct": _pct(row[:12].sum(), total),
+                           "within_hour_pct": _pct(row[12], total),
+                           "later_pct": _pct(row[13:].sum(), total),
+                           "by_hour": {str(hour - 12): int(row[hour]) for hour in range(24) if row[hour]}})
+        return {"users": users, "entries": int(self.entries.sum()), "funnel": funnel, "cohorts": cohorts,
+                "words": words, "save_timing": timing}
+
+
+def _pct(part, whole):
+    return round(100 * float(part) / whole, 1) if whole else 0.0
+
+
+# Smallest word count at or below which q% of entries fall
+def _quantile(cumulative, q):
+    if not cumulative[-1]:
+        return None
+    return int(np.searchsorted(cumulative, cumulative[-1] * q / 100))
+
+
+def build_report(store, chunk_size=100000):
+    reports = store.map(lambda conn: CohortReport().scan(conn, chunk_size))
+    report = reports[0]
+    for other in reports[1:]:
+        report.merge(other)
+    return report
+
+
+def format_report(summary):
+    lines = [f"{summary['users']} users, {summary['entries']} entries", "", "Funnel (users who reached each day)"]
+    for step in summary["funnel"]:
+        bar = "#" * int(step["reached_pct"] / 2.5)
+        lines.append(f"  {step['day']:>2} {step['principle'][:28]:<28} {step['reached']:>9} "
+                     f"{step['reached_pct']:>5.1f}% {bar}")
+    lines += ["", "Retention by start week (% who saved day N)",
+              "  week        users " + " ".join(f"{'day ' + str(day):>7}" for day in MILESTONES)]
+    for cohort in summary["cohorts"]:
+        lines.append(f"  {cohort['week']} {cohort['users']:>6} "
+                     + " ".join(f"{cohort[f'day{day}_pct']:>6.1f}%" for day in MILESTONES))
+    lines += ["", "Words per entry", "  day principle                     entries   mean  p25  p50  p90"]
+    for day in summary["words"]:
+        if day["entries"]:
+            lines.append(f"  {day['day']:>3} {day['principle'][:28]:<28} {day['entries']:>9} {day['mean']:>6} "
+                         f"{day['p25']:>4} {day['p50']:>4} {day['p90']:>4}")
+    lines += ["", "Save time vs. journal_time", "  slot   entries  before  within 1h  later"]
+    for slot in summary["save_timing"]:
+        lines.append(f"  {slot['journal_time']} {slot['entries']:>8} {slot['before_pct']:>6.1f}% "
+                     f"{slot['within_hour_pct']:>8.1f}% {slot['later_pct']:>6.1f}%")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Funnel, retention and writing report across all users")
+    parser.add_argument("--db", default=db.DB_PATH)
+    parser.add_argument("--chunk", type=int, default=100000, help="rows fetched at a time")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    store = shards.ShardedStore(shards.shard_paths(args.db), size=1)
+    try:
+        store.migrate()
+        summary = build_report(store, args.chunk).summary()
+    finally:
+        store.close()
+    print(format_report(summary))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,447 @@
+# Headless JSON API over the same data layer as happiness.py, for mobile
+# clients, links from the reminder email and integrations that don't want a
+# Streamlit session:
+#
+#   python api.py [--host 127.0.0.1] [--port 8502]
+#
+#   POST /api/login                    {"email", "password"} -> {"token", "expires_at"}
+#   GET  /api/today                    the current day's principle, insight, tip and prompts
+#   GET  /api/entry                    the current day's entry, or null
+#   PUT  /api/entry                    {"entry"}: save it and move on to the next day
+#   GET  /api/entries?before=&limit=   past entries as previews, newest first
+#   GET  /api/entries/<day>            one entry in full
+#   GET  /api/stats                    totals and streaks for the current cycle
+#
+# Everything but login needs "Authorization: Bearer <token>". GET responses
+# carry an ETag made from a hash of the user's email and users.version, which
+# every save and new cycle bumps, so a client sending it back in If-None-Match gets a 304 after a single
+# primary-key lookup. Bodies are gzipped for clients that accept it.
+#
+# The server is a plain asyncio one (HTTP/1.1 with keep-alive); database work
+# runs on a thread pool the size of the connection pool, and password checks
+# on passwords.PasswordHasher's own workers.
+import argparse
+import asyncio
+import base64
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import os
+import re
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+import content
+import db
+import metrics
+import passwords
+import schedule
+import shards
+import writer
+
+API_HOST = os.getenv('HAPPINESS_API_HOST', '127.0.0.1')
+API_PORT = int(os.getenv('HAPPINESS_API_PORT', '8502'))
+# Tokens are signed with this; without it a random key is used and tokens
+# stop working when the process restarts
+API_SECRET = os.getenv('HAPPINESS_API_SECRET')
+TOKEN_TTL = int(os.getenv('HAPPINESS_API_TOKEN_TTL', str(30 * 86400)))
+MAX_BODY = 64 * 1024
+GZIP_MIN = 512  # smaller bodies aren't worth compressing
+PAGE_SIZE = 10
+MAX_PAGE_SIZE = 100
+PREVIEW_CHARS = 200
+
+# Part of every ETag, so cached responses don't survive a change to the
+# curriculum
+CONTENT_TAG = hashlib.blake2b(repr(content.DAYS).encode(), digest_size=4).hexdigest()
+
+log = logging.getLogger(__name__)
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message=None, headers=None):
+        super().__init__(message or HTTPStatus(status).phrase)
+        self.status = status
+        self.headers = headers or {}
+
+
+class Request:
+    def __init__(self, method, target, headers, body):
+        self.method = method
+        url = urlsplit(target)
+        self.path = url.path
+        self.query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        self.headers = headers
+        self.body = body
+        self.route = None  # the handler's name, once routed
+
+    def json(self):
+        try:
+            data = json.loads(self.body or b"null")
+        except ValueError:
+            raise HTTPError(400, "body is not valid JSON")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "body must be a JSON object")
+        return data
+
+    def int_param(self, name, default=None, low=1, high=None):
+        value = self.query.get(name)
+        if value is None:
+            return default
+        try:
+            number = int(value)
+        except ValueError:
+            raise HTTPError(400, f"{name} must be an integer")
+        if number < low or (high is not None and number > high):
+            raise HTTPError(400, f"{name} is out of range")
+        return number
+
+
+# Stateless bearer tokens: "<email, base64>.<expiry>.<HMAC of both>". Checking
+# one needs no database read.
+class Tokens:
+    def __init__(self, secret=None, ttl=TOKEN_TTL):
+        if secret is None:
+            log.warning("HAPPINESS_API_SECRET is not set; tokens will not survive a restart")
+            secret = secrets.token_bytes(32)
+        self.key = secret.encode() if isinstance(secret, str) else secret
+        self.ttl = ttl
+
+    def _sign(self, payload):
+        return base64.urlsafe_b64encode(hmac.new(self.key, payload.encode(), "sha256").digest()[:24]).decode()
+
+    def issue(self, email, now=None):
+        expires = int(now if now is not None else time.time()) + self.ttl
+        payload = f"{base64.urlsafe_b64encode(email.encode()).decode().rstrip('=')}.{expires}"
+        return f"{payload}.{self._sign(payload)}", expires
+
+    # The token's email, or None if it is malformed, forged or expired
+    def check(self, token, now=None):
+        if not token.isascii():
+            return None
+        payload, _, signature = token.rpartition(".")
+        if not payload or not hmac.compare_digest(self._sign(payload).encode(), signature.encode()):
+            return None
+        encoded, _, expires = payload.partition(".")
+        if not expires.isdigit() or int(expires) < (now if now is not None else time.time()):
+            return None
+        try:
+            return base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)).decode()
+        except ValueError:
+            return None
+
+
+# Weak ETag for a user's data at `version`. The email hash keeps one user's
+# tag from matching another's at the same version, for clients that cache by
+# path across accounts.
+def _etag(email, version):
+    user = hashlib.blake2b(email.encode(), digest_size=4).hexdigest()
+    return f'W/"{user}-{version}-{CONTENT_TAG}"'
+
+
+def _day_json(day):
+    return {"day": day.day, "principle": day.principle, "insight": day.insight, "tip": day.tip,
+            "prompts": list(day.prompts)}
+
+
+class JournalAPI:
+    def __init__(self, store=None, tokens=None, hasher=None, workers=db.POOL_SIZE):
+        self.store = store or shards.ShardedStore()
+        self.tokens = tokens or Tokens(API_SECRET)
+        self.hasher = hasher or passwords.PasswordHasher()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api-db")
+        # Saves go through the group-commit writers when they are on, as in the UI
+        self.writers = None
+        if writer.GROUP_COMMIT:
+            self.writers = [writer.GroupCommitWriter(path) for path in self.store.paths]
+        self.routes = [
+            ("POST", re.compile(r"/api/login"), self.login),
+            ("GET", re.compile(r"/api/today"), self.today),
+            ("GET", re.compile(r"/api/entry"), self.entry),
+            ("PUT", re.compile(r"/api/entry"), self.put_entry),
+            ("GET", re.compile(r"/api/entries"), self.entries),
+            ("GET", re.compile(r"/api/entries/(\d+)"), self.entry_for_day),
+            ("GET", re.compile(r"/api/stats"), self.stats),
+        ]
+
+    async def _db(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    def _email(self, request):
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        email = self.tokens.check(token.strip()) if scheme.lower() == "bearer" else None
+        if email is None:
+            raise HTTPError(401, "missing or invalid token", {"WWW-Authenticate": "Bearer"})
+        return email
+
+    # Route a request to its handler. Returns (status, payload, headers).
+    async def handle(self, request):
+        allowed = []
+        for method, pattern, handler in self.routes:
+            match = pattern.fullmatch(request.path)
+            if match is None:
+                continue
+            if method == request.method or (method == "GET" and request.method == "HEAD"):
+                request.route = handler.__name__
+                return await handler(request, *match.groups())
+            allowed.append(method)
+        if allowed:
+            raise HTTPError(405, headers={"Allow": ", ".join(allowed)})
+        raise HTTPError(404)
+
+    # GET handlers: read the user's version first and answer 304 if the client
+    # already has it; otherwise load(conn, email, current_day) builds the body.
+    # Runs as one job on the database pool.
+    async def _conditional_get(self, request, load):
+        email = self._email(request)
+        if_none_match = request.headers.get("if-none-match")
+
+        def read():
+            with self.store.connection(email) as conn:
+                progress = db.get_progress(conn, email)
+                if progress is None:
+                    raise HTTPError(401, "unknown user")
+                current_day, _, version, _ = progress
+                etag = _etag(email, version)
+                if if_none_match and etag in (tag.strip() for tag in if_none_match.split(",")):
+                    return 304, None, {"ETag": etag}
+                return 200, load(conn, email, current_day), {"ETag": etag}
+
+        return await self._db(read)
+
+    async def login(self, request):
+        data = request.json()
+        email, password = data.get("email"), data.get("password")
+        if not isinstance(email, str) or not isinstance(password, str):
+            raise HTTPError(400, "email and password are required")
+
+        def get_login():
+            with self.store.connection(email) as conn:
+                return db.get_login(conn, email)
+
+        loop = asyncio.get_running_loop()
+        result = await self._db(get_login)
+        try:
+            matches, needs_rehash = await loop.run_in_executor(None, self.hasher.verify, password,
+                                                               result[0] if result else None)
+        except passwords.Overloaded:
+            raise HTTPError(503, "too many logins in progress, try again shortly", {"Retry-After": "1"})
+        if not matches:
+            raise HTTPError(401, "invalid email or password")
+        if needs_rehash:
+            try:
+                password_hash = await loop.run_in_executor(None, self.hasher.hash, password)
+            except passwords.Overloaded:
+                pass
+            else:
+                await self._db(self._update_password, email, password_hash)
+        token, expires = self.tokens.issue(email)
+        return 200, {"token": token, "expires_at": expires}, {}
+
+    def _update_password(self, email, password_hash):
+        with self.store.connection(email) as conn:
+            db.update_password(conn, email, password_hash)
+
+    async def today(self, request):
+        def load(conn, email, current_day):
+            if current_day > content.TOTAL_DAYS:
+                return {"day": current_day, "completed": True}
+            return {**_day_json(content.get_day(current_day)), "completed": False}
+
+        return await self._conditional_get(request, load)
+
+    async def entry(self, request):
+        def load(conn, email, current_day):
+            return {"day": current_day, "entry": db.get_entry(conn, email, current_day)}
+
+        return await self._conditional_get(request, load)
+
+    async def entry_for_day(self, request, day):
+        day = int(day)
+        if not 1 <= day <= content.TOTAL_DAYS:
+            raise HTTPError(404, f"no entry for day {day}")
+
+        def load(conn, email, current_day):
+            entry = db.get_entry(conn, email, day)
+            if entry is None:
+                raise HTTPError(404, f"no entry for day {day}")
+            return {"day": day, "entry": entry}
+
+        return await self._conditional_get(request, load)
+
+    # Keyset pagination on day, as in the UI's history list: pass the last
+    # page's next_before as ?before= to get the page after it
+    async def entries(self, request):
+        # Entries only go up to the last day, so no bigger value changes the page
+        before = request.int_param("before", high=content.TOTAL_DAYS + 1)
+        limit = request.int_param("limit", PAGE_SIZE, high=MAX_PAGE_SIZE)
+
+        def load(conn, email, current_day):
+            rows = db.get_entry_previews(conn, email, before, limit + 1, PREVIEW_CHARS)
+            page = [{"day": day, "date": date, "preview": preview, "truncated": length > len(preview)}
+                    for day, date, preview, length in rows[:limit]]
+            return {"entries": page, "next_before": page[-1]["day"] if len(rows) > limit else None}
+
+        return await self._conditional_get(request, load)
+
+    async def stats(self, request):
+        def load(conn, email, current_day):
+            stats = db.get_user_stats(conn, email) or db.refresh_user_stats(conn, email)
+            return {"current_day": current_day, "entry_count": stats.entry_count, "total_words": stats.total_words,
+                    "avg_words": stats.avg_words, "current_streak": stats.current_streak,
+                    "longest_streak": stats.longest_streak}
+
+        return await self._conditional_get(request, load)
+
+    # Saves the entry for the user's current day, as the UI's save button does
+    async def put_entry(self, request):
+        email = self._email(request)
+        entry = request.json().get("entry")
+        if not isinstance(entry, str) or not entry.strip():
+            raise HTTPError(400, "entry must be a non-empty string")
+
+        def save():
+            with self.store.connection(email) as conn:
+                progress = db.get_progress(conn, email)
+                if progress is None:
+                    raise HTTPError(401, "unknown user")
+                current_day, _, _, timezone = progress
+                if current_day > content.TOTAL_DAYS:
+                    raise HTTPError(409, "this cycle is complete")
+                date = schedule.today(timezone)
+                if self.writers is None:
+                    return current_day, db.save_entry(conn, email, date, entry, current_day)
+            group = self.writers[shards.shard_index(email, len(self.writers))]
+            return current_day, group.save_entry(email, date, entry, current_day)
+
+        try:
+            day, version = await self._db(save)
+        except writer.Overloaded:
+            raise HTTPError(503, "too many saves in progress, try again shortly", {"Retry-After": "1"})
+        return 200, {"day": day, "next_day": day + 1}, {"ETag": _etag(email, version)}
+
+    def close(self):
+        if self.writers:
+            for group in self.writers:
+                group.close()
+        self.executor.shutdown(wait=True)
+        self.hasher.shutdown()
+        self.store.close()
+
+
+def _encode(status, payload, headers, accept_encoding=""):
+    body = b"" if payload is None else json.dumps(payload, separators=(",", ":")).encode()
+    headers = {"Content-Type": "application/json", "Cache-Control": "private, no-cache",
+               "Vary": "Authorization, Accept-Encoding", **headers}
+    if len(body) >= GZIP_MIN and "gzip" in accept_encoding:
+        body = gzip.compress(body, 6, mtime=0)
+        headers["Content-Encoding"] = "gzip"
+    if status == 304:
+        body = b""
+        headers.pop("Content-Type")
+    else:
+        headers["Content-Length"] = str(len(body))
+    return body, headers
+
+
+async def _read_request(reader):
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, version = line.decode("latin-1").split()
+    except ValueError:
+        raise HTTPError(400, "malformed request line")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+        if len(headers) > 100:
+            raise HTTPError(431)
+    length = headers.get("content-length") or "0"
+    if not length.isdigit():
+        raise HTTPError(400, "bad Content-Length")
+    length = int(length)
+    if length > MAX_BODY:
+        raise HTTPError(413)
+    body = await reader.readexactly(length) if length else b""
+    keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+    return Request(method, target, headers, body), keep_alive
+
+
+async def _serve_connection(api, reader, stream):
+    try:
+        while True:
+            request, keep_alive = None, False
+            start = time.perf_counter()
+            try:
+                parsed = await _read_request(reader)
+                if parsed is None:
+                    break
+                request, keep_alive = parsed
+                status, payload, headers = await api.handle(request)
+            except HTTPError as e:
+                status, payload, headers = e.status, {"error": str(e)}, e.headers
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+            except Exception:
+                log.exception("Error handling %s", request.path if request else "request")
+                status, payload, headers, keep_alive = 500, {"error": "internal error"}, {}, False
+            metrics.observe("happiness_api_request_seconds", time.perf_counter() - start, "API request latency",
+                            route=(request and request.route) or "none", status=str(status))
+            body, headers = _encode(status, payload, headers, request.headers.get("accept-encoding", "")
+                                    if request else "")
+            if not keep_alive:
+                headers["Connection"] = "close"
+            head = f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n" + "".join(
+                f"{name}: {value}\r\n" for name, value in headers.items()) + "\r\n"
+            stream.write(head.encode("latin-1") + (body if not request or request.method != "HEAD" else b""))
+            await stream.drain()
+            if not keep_alive:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        stream.close()
+
+
+async def serve(api, host=API_HOST, port=API_PORT, ready=None):
+    server = await asyncio.start_server(lambda r, w: _serve_connection(api, r, w), host, port)
+    log.info("Serving the journal API on %s", ", ".join(f"{s.getsockname()[0]}:{s.getsockname()[1]}"
+                                                        for s in server.sockets))
+    if ready is not None:
+        ready(server)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON API for the happiness journal")
+    parser.add_argument("--db", default=db.DB_PATH)
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    metrics.start_http_server()
+    store = shards.ShardedStore(shards.shard_paths(args.db))
+    store.migrate()
+    api = JournalAPI(store)
+    try:
+        asyncio.run(serve(api, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        api.close()
+
+
+if __name__ == "__main__":
+    main()
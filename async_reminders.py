@@ -0,0 +1,251 @@
+# Asyncio reminder engine for busy slots. A fixed number of workers, each
+# holding one SMTP session, drain a queue of messages under a shared rate limit,
+# retrying transient failures with backoff and counting anything that lands
+# after the slot's deadline as late:
+#
+#   python async_reminders.py --slot 21:00 --concurrency 50 --rate 200 --grace 15
+#
+# Uses aiosmtplib when it is installed; otherwise each worker drives a blocking
+# reminders.SMTPSession on a thread pool sized to --concurrency, so every
+# worker can have a send in flight. Users are read from the database on a
+# producer thread, so SQLite fetches don't hold up the workers.
+import argparse
+import asyncio
+import logging
+import random
+import smtplib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import content
+import db
+import metrics
+import reminders
+import shards
+
+try:
+    import aiosmtplib
+except ImportError:
+    aiosmtplib = None
+
+log = logging.getLogger(__name__)
+
+
+# Without aiosmtplib, blocking sends run on `executor` (the loop's default
+# executor if None, which is capped at min(32, cpus + 4) threads)
+class AsyncSMTPSession:
+    def __init__(self, host=None, port=None, user=None, password=None, starttls=None, timeout=30,
+                 executor=None):
+        self.host = host or reminders.SMTP_HOST
+        self.port = port or reminders.SMTP_PORT
+        self.user = user if user is not None else reminders.EMAIL_SENDER
+        self.password = password if password is not None else reminders.EMAIL_PASSWORD
+        self.starttls = reminders.SMTP_STARTTLS if starttls is None else starttls
+        self.timeout = timeout
+        self.executor = executor
+        self._client = None
+
+    async def _in_thread(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def _connect(self):
+        if aiosmtplib is None:
+            self._client = reminders.SMTPSession(self.host, self.port, self.user, self.password,
+                                                 self.starttls, self.timeout)
+            return
+        client = aiosmtplib.SMTP(hostname=self.host, port=self.port, start_tls=self.starttls,
+                                 timeout=self.timeout)
+        await client.connect()
+        if self.user and self.password:
+            await client.login(self.user, self.password)
+        self._client = client
+
+    async def send(self, msg):
+        if self._client is None:
+            await self._connect()
+        if aiosmtplib is None:
+            await self._in_thread(self._client.send, msg)
+            return
+        start = time.perf_counter()
+        try:
+            await self._client.send_message(msg)
+        except aiosmtplib.SMTPServerDisconnected:
+            await self.close()
+            await self._connect()
+            await self._client.send_message(msg)
+        metrics.observe("happiness_smtp_send_seconds", time.perf_counter() - start, "SMTP send latency")
+
+    async def close(self):
+        client, self._client = self._client, None
+        if client is None:
+            return
+        if aiosmtplib is None:
+            await self._in_thread(client.close)
+            return
+        try:
+            await client.quit()
+        except Exception:
+            client.close()
+
+
+# Token bucket shared by all workers so the whole run stays under the
+# provider's messages-per-second cap
+class RateLimiter:
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.rate:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class SlotReport:
+    def __init__(self, slot, deadline):
+        self.slot = slot
+        self.deadline = deadline
+        self.sent = 0
+        self.failed = 0
+        self.late = 0
+        self.retries = 0
+        self.elapsed = 0.0
+
+    @property
+    def rate(self):
+        return self.sent / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return (f"slot={self.slot} sent={self.sent} failed={self.failed} late={self.late} "
+                f"retries={self.retries} in {self.elapsed:.2f}s ({self.rate:.1f} msg/s)")
+
+
+# 4xx replies and dropped connections are worth retrying; 5xx replies and
+# other protocol errors are not
+def is_transient(error):
+    code = getattr(error, 'code', None) or getattr(error, 'smtp_code', None)
+    if isinstance(code, int):
+        return 400 <= code < 500
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if aiosmtplib is not None:
+        if isinstance(error, (aiosmtplib.SMTPServerDisconnected, aiosmtplib.SMTPConnectError,
+                              aiosmtplib.SMTPTimeoutError)):
+            return True
+        if isinstance(error, aiosmtplib.SMTPException):
+            return False
+    if isinstance(error, smtplib.SMTPException):
+        return False
+    return isinstance(error, (OSError, asyncio.TimeoutError))
+
+
+async def _worker(messages, session, limiter, report, retries, backoff):
+    try:
+        while True:
+            msg = await messages.get()
+            if msg is None:
+                return
+            for attempt in range(retries + 1):
+                await limiter.acquire()
+                try:
+                    await session.send(msg)
+                except Exception as e:
+                    await session.close()
+                    if attempt < retries and is_transient(e):
+                        report.retries += 1
+                        await asyncio.sleep(backoff * 2 ** attempt * (0.5 + random.random()))
+                        continue
+                    report.failed += 1
+                    log.warning("Failed to send reminder to %s: %s", msg['To'], e)
+                else:
+                    report.sent += 1
+                    if time.time() > report.deadline:
+                        report.late += 1
+                break
+    finally:
+        await session.close()
+
+
+# Runs on its own thread: reads the slot's users and hands their messages to
+# the workers, waiting while the queue is full
+def _produce(loop, messages, journal_time, db_path):
+    store = shards.ShardedStore(shards.shard_paths(db_path), size=1)
+    try:
+        store.migrate()
+        for email, slot, current_day in store.iter_users_in_slot(journal_time, content.TOTAL_DAYS):
+            msg = reminders.build_message(email, slot, current_day)
+            asyncio.run_coroutine_threadsafe(messages.put(msg), loop).result()
+    finally:
+        store.close()
+
+
+# Send every due reminder for a slot. `deadline` is a Unix timestamp; sends that
+# complete after it are still made but counted as late. session_factory is
+# called with the engine's executor= for sessions that send from threads.
+async def send_slot(journal_time, deadline, db_path=None, concurrency=20, rate=0, retries=3,
+                    backoff=0.5, session_factory=AsyncSMTPSession):
+    report = SlotReport(journal_time, deadline)
+    limiter = RateLimiter(rate)
+    messages = asyncio.Queue(maxsize=concurrency * 10)
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="smtp")
+    start = time.perf_counter()
+    workers = [asyncio.create_task(_worker(messages, session_factory(executor=executor), limiter, report,
+                                           retries, backoff))
+               for _ in range(concurrency)]
+
+    try:
+        await asyncio.to_thread(_produce, asyncio.get_running_loop(), messages, journal_time, db_path)
+    finally:
+        for _ in workers:
+            await messages.put(None)
+        await asyncio.gather(*workers)
+        executor.shutdown(wait=True)
+    report.elapsed = time.perf_counter() - start
+    return report
+
+
+# The deadline for a slot run: today's slot time (local) plus a grace period
+def slot_deadline(journal_time, grace_minutes, now=None):
+    now = now or datetime.now()
+    hour, minute = map(int, journal_time.split(":"))
+    due = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    return (due + timedelta(minutes=grace_minutes)).timestamp()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send journal reminders for one time slot concurrently")
+    parser.add_argument("--slot", required=True, help="journal_time to send for, e.g. 21:00")
+    parser.add_argument("--db", default=db.DB_PATH)
+    parser.add_argument("--concurrency", type=int, default=20, help="SMTP sessions sending at once")
+    parser.add_argument("--rate", type=float, default=0, help="max messages per second (0 = unlimited)")
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--grace", type=float, default=15, help="minutes after the slot before a send is late")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    report = asyncio.run(send_slot(args.slot, slot_deadline(args.slot, args.grace), args.db,
+                                   args.concurrency, args.rate, args.retries))
+    log.info("%s", report)
+    if report.late:
+        log.warning("%d reminders for %s went out after the deadline", report.late, args.slot)
+    metrics.inc("happiness_reminders_sent_total", report.sent, "Reminders sent")
+    metrics.inc("happiness_reminders_failed_total", report.failed, "Reminders that could not be sent")
+    metrics.inc("happiness_reminders_late_total", report.late, "Reminders sent after the slot deadline")
+    metrics.write_textfile()
+    return 0 if report.failed == 0 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
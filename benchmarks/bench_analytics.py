@@ -0,0 +1,127 @@
+# Cohort report over a synthetic dataset (10M entries by default): time and
+# peak memory of the chunked numpy scan, next to a plain Python loop over the
+# same rows. Peak heap memory (measured in a second, traced run) should not
+# grow with --entries; the process RSS also includes up to 128 MB of SQLite
+# mmap and page cache.
+#
+#   python benchmarks/bench_analytics.py [--entries 10000000] [--chunk 100000]
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import analytics  # noqa: E402
+import db  # noqa: E402
+import schedule  # noqa: E402
+
+SLOTS = ("07:00", "12:00", "18:00", "21:00")
+TIMEZONES = ("UTC", "Europe/London", "America/New_York", "America/Los_Angeles", "Asia/Tokyo", "Australia/Sydney")
+
+
+# Users in a few timezones start on a random day in the last half year and
+# drop out along the way, so cohorts and the funnel have some shape. Saves
+# land around journal_time in the user's own timezone. Entry text is a
+# placeholder: the report only reads the word count.
+def generate(path, entries):
+    conn = db.connect(path)
+    db.migrate(conn)
+    # The search index isn't read by the report; skip maintaining it
+    for trigger in ("journals_fts_insert", "journals_fts_delete", "journals_fts_update"):
+        conn.execute(f"DROP TRIGGER {trigger}")
+    rng = random.Random(7)
+    written = n = 0
+    first_date = date.fromordinal(date.today().toordinal() - 180)
+    with db.transaction(conn):
+        while written < entries:
+            users, rows = [], []
+            for _ in range(10000):
+                email = f"user{n}@example.com"
+                first = date.fromordinal(first_date.toordinal() + rng.randrange(180))
+                slot, timezone = rng.choice(SLOTS), rng.choice(TIMEZONES)
+                current_day = min(22, 1 + int(rng.expovariate(1 / 12)))
+                users.append((email, "x", slot, first.isoformat(), current_day, 0, timezone))
+                hour, minute = map(int, slot.split(":"))
+                for day in range(1, current_day):
+                    due = datetime.combine(date.fromordinal(first.toordinal() + day - 1), datetime.min.time(),
+                                           schedule.zone(timezone)).replace(hour=hour, minute=minute)
+                    saved_at = int(due.timestamp() + rng.gauss(1800, 3600))
+                    rows.append((email, "2026-01-01", "x", day, max(1, int(rng.lognormvariate(4, 0.6))), saved_at))
+                n += 1
+            conn.executemany("""INSERT INTO users (email, password, journal_time, start_date, current_day, version,
+                                timezone) VALUES (?, ?, ?, ?, ?, ?, ?)""", users)
+            rows = rows[:entries - written]
+            conn.executemany("""INSERT INTO journals (email, date, entry, day, words, saved_at)
+                                VALUES (?, ?, ?, ?, ?, ?)""", rows)
+            written += len(rows)
+    conn.close()
+    return n
+
+
+# The same entry counters as the report, built one row at a time
+def python_scan(conn, chunk_size):
+    entries, words = [0] * 22, [0] * 22
+    histogram, offsets = {}, {}
+    cursor = conn.execute("""SELECT j.day, coalesce(j.words, 0), coalesce(j.saved_at, -1),
+                                    coalesce(CAST(substr(u.journal_time, 1, 2) AS INTEGER) * 60
+                                             + CAST(substr(u.journal_time, 4, 2) AS INTEGER), -1),
+                                    coalesce(u.timezone, ?)
+                             FROM journals j JOIN users u ON u.email = j.email""", (schedule.DEFAULT_TIMEZONE,))
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        for day, count, saved_at, slot, timezone in rows:
+            entries[day] += 1
+            words[day] += count
+            key = (day, min(count, analytics.MAX_WORDS))
+            histogram[key] = histogram.get(key, 0) + 1
+            if saved_at >= 0 and slot >= 0:
+                local = saved_at + analytics._hour_offset(timezone, saved_at // 3600)
+                key = (slot, (local // 60 % 1440 - slot + 720) % 1440 // 60)
+                offsets[key] = offsets.get(key, 0) + 1
+    return entries, offsets
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entries", type=int, default=10_000_000)
+    parser.add_argument("--chunk", type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        start = time.perf_counter()
+        # In a child process, so generating doesn't count towards this one's peak memory
+        with multiprocessing.get_context("spawn").Pool(1) as pool:
+            users = pool.apply(generate, (path, args.entries))
+        print(f"generated {users} users / {args.entries} entries in {time.perf_counter() - start:.0f}s")
+
+        conn = db.connect(path)
+        start = time.perf_counter()
+        report = analytics.CohortReport().scan(conn, args.chunk)
+        summary = report.summary()
+        elapsed = time.perf_counter() - start
+        assert summary["entries"] == args.entries, summary["entries"]
+        tracemalloc.start()
+        analytics.CohortReport().scan(conn, args.chunk).summary()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"numpy:  {elapsed:6.1f}s ({args.entries / elapsed:,.0f} entries/s), peak heap {peak / 2 ** 20:.0f} MB")
+
+        start = time.perf_counter()
+        entries, offsets = python_scan(conn, args.chunk)
+        elapsed = time.perf_counter() - start
+        assert entries == report.entries.tolist(), "entry counts differ"
+        assert all(report.save_offsets[slot, hour] == count for (slot, hour), count in offsets.items())
+        print(f"python: {elapsed:6.1f}s ({args.entries / elapsed:,.0f} entries/s), same counters")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
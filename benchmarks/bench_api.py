@@ -0,0 +1,282 @@
+# Throughput of the JSON API against the Streamlit path, all on localhost.
+# Starts api.py against a temporary database and has --threads clients (one
+# user each, over keep-alive connections) repeat a journaling visit: fetch
+# today's content and entry, save the entry, list recent entries. A second
+# pass re-fetches today's content with If-None-Match, as a polling client
+# would. With Streamlit installed, the same visit (a rerun to load the day,
+# then a save) is run through the real happiness.py with AppTest, one client
+# per process since AppTest sets up a process-wide Streamlit runtime.
+#
+#   python benchmarks/bench_api.py [--threads 8] [--visits 21]
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import db  # noqa: E402
+import passwords  # noqa: E402
+
+APP = os.path.join(ROOT, "happiness.py")
+PASSWORD = "correct horse battery staple"
+ENTRY = "Grateful for a slow breakfast and a walk by the river. " * 4
+SCRYPT_N = 2 ** 10
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def setup(path, users):
+    conn = db.connect(path)
+    db.migrate(conn)
+    password_hash = passwords.hash_password(PASSWORD, n=SCRYPT_N)
+    for n in range(users):
+        db.create_user(conn, f"user{n}@example.com", password_hash, "21:00", "2026-01-01")
+    conn.close()
+
+
+def start_server(path, port):
+    env = dict(os.environ, HAPPINESS_SCRYPT_N=str(SCRYPT_N), HAPPINESS_API_SECRET="bench")
+    server = subprocess.Popen([sys.executable, os.path.join(ROOT, "api.py"), "--db", path, "--port", str(port)],
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return server
+        except OSError:
+            time.sleep(0.05)
+    server.kill()
+    raise RuntimeError("api.py did not start")
+
+
+class Client:
+    def __init__(self, port, email):
+        self.conn = http.client.HTTPConnection("127.0.0.1", port)
+        self.headers = {"Accept-Encoding": "gzip"}
+        status, body, _ = self.request("POST", "/api/login", {"email": email, "password": PASSWORD})
+        assert status == 200, (status, body)
+        self.headers["Authorization"] = f"Bearer {json.loads(body)['token']}"
+
+    def request(self, method, path, payload=None, headers=None):
+        self.conn.request(method, path, json.dumps(payload) if payload is not None else None,
+                          {**self.headers, **(headers or {})})
+        response = self.conn.getresponse()
+        return response.status, response.read(), response.getheader("ETag")
+
+
+def timed_steps(steps):
+    latencies = defaultdict(list)
+    for name, fn in steps:
+        start = time.perf_counter()
+        fn()
+        latencies[name].append(time.perf_counter() - start)
+    return latencies
+
+
+# Runs work(n) on `threads` threads; each returns its (name, fn) steps, which
+# are timed once every thread is ready. A thread that fails while getting
+# ready aborts the barrier so the others don't wait for it forever.
+def run(threads, work):
+    barrier = threading.Barrier(threads + 1)
+    latencies = defaultdict(list)
+    errors = []
+    lock = threading.Lock()
+
+    def worker(n):
+        try:
+            steps = work(n)
+            barrier.wait()
+            mine = timed_steps(steps)
+        except threading.BrokenBarrierError:
+            return
+        except Exception as e:
+            errors.append(e)
+            barrier.abort()
+            return
+        with lock:
+            for name, values in mine.items():
+                latencies[name].extend(values)
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for t in workers:
+        t.start()
+    try:
+        barrier.wait()
+    except threading.BrokenBarrierError:
+        pass
+    start = time.perf_counter()
+    for t in workers:
+        t.join()
+    if errors:
+        raise errors[0]
+    return latencies, time.perf_counter() - start
+
+
+def report(label, latencies, elapsed, unit="requests"):
+    total = sum(len(values) for values in latencies.values())
+    print(f"{label}: {total} {unit} in {elapsed:.2f}s ({total / elapsed:,.0f}/s)")
+    for name, values in latencies.items():
+        values.sort()
+        print(f"  {name:<14} p50 {values[len(values) // 2] * 1e3:7.2f} ms   "
+              f"p99 {values[int(len(values) * 0.99)] * 1e3:7.2f} ms")
+    return total / elapsed
+
+
+def api_visits(port, visits):
+    def work(n):
+        client = Client(port, f"user{n}@example.com")
+
+        def get(path):
+            status, _, _ = client.request("GET", path)
+            assert status == 200, (path, status)
+
+        def save():
+            status, body, _ = client.request("PUT", "/api/entry", {"entry": ENTRY})
+            assert status in (200, 409), body
+
+        steps = []
+        for _ in range(visits):
+            steps += [("GET today", lambda: get("/api/today")), ("GET entry", lambda: get("/api/entry")),
+                      ("PUT entry", save), ("GET entries", lambda: get("/api/entries"))]
+        return steps
+    return work
+
+
+def api_conditional(port, requests):
+    def work(n):
+        client = Client(port, f"user{n}@example.com")
+        _, _, etag = client.request("GET", "/api/today")
+
+        def revalidate():
+            status, _, _ = client.request("GET", "/api/today", headers={"If-None-Match": etag})
+            assert status == 304, status
+
+        return [("GET today 304", revalidate)] * requests
+    return work
+
+
+def streamlit_visits(visits, timeout):
+    from streamlit.testing.v1 import AppTest
+
+    def work(n):
+        at = AppTest.from_file(APP, default_timeout=timeout)
+        at.run()
+        at.radio[0].set_value("Login")
+        at.text_input[0].input(f"user{n}@example.com")
+        at.text_input[1].input(PASSWORD)
+        at.button[0].click()
+        at.run()
+        if at.exception or not at.session_state.logged_in:
+            raise RuntimeError(f"user{n} could not log in: {[e.message for e in at.exception]}")
+
+        def load():
+            at.button(key="view_insight").click()
+            at.run()
+
+        def save():
+            at.text_area[0].input(ENTRY)
+            at.button(key="save_entry").click()
+            at.run()
+
+        steps = []
+        for _ in range(visits):
+            steps += [("load day", load), ("save", save)]
+        return steps
+    return work
+
+
+# One Streamlit client in its own process. Results, or the error that stopped
+# it, go back on `results`.
+def streamlit_client(n, visits, timeout, barrier, results):
+    try:
+        steps = streamlit_visits(visits, timeout)(n)
+        barrier.wait()
+        results.put((n, dict(timed_steps(steps)), None))
+    except threading.BrokenBarrierError:
+        results.put((n, None, None))
+    except Exception as e:
+        barrier.abort()
+        results.put((n, None, repr(e)))
+
+
+def run_processes(clients, first, visits, timeout):
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(clients + 1)
+    results = context.Queue()
+    processes = [context.Process(target=streamlit_client, args=(first + n, visits, timeout, barrier, results))
+                 for n in range(clients)]
+    for process in processes:
+        process.start()
+    try:
+        barrier.wait()
+    except threading.BrokenBarrierError:
+        pass
+    start = time.perf_counter()
+    latencies, errors = defaultdict(list), []
+    for _ in processes:
+        _, mine, error = results.get()
+        if error:
+            errors.append(error)
+        for name, values in (mine or {}).items():
+            latencies[name].extend(values)
+    elapsed = time.perf_counter() - start
+    for process in processes:
+        process.join()
+    if errors:
+        raise RuntimeError(f"Streamlit client failed: {errors[0]}")
+    return latencies, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=8, help="clients at once, one user each (processes for Streamlit)")
+    parser.add_argument("--visits", type=int, default=21, help="journaling visits per client")
+    parser.add_argument("--revalidations", type=int, default=200, help="conditional GETs per client")
+    parser.add_argument("--timeout", type=float, default=30, help="seconds allowed per Streamlit rerun")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        setup(path, args.threads * 2)
+        port = free_port()
+        server = start_server(path, port)
+        try:
+            latencies, elapsed = run(args.threads, api_visits(port, args.visits))
+            api_rate = report("API visits", latencies, elapsed)
+            visit_rate = api_rate / 4
+            latencies, elapsed = run(args.threads, api_conditional(port, args.revalidations))
+            report("API conditional GETs", latencies, elapsed)
+        finally:
+            server.terminate()
+            server.wait()
+
+        try:
+            import streamlit  # noqa: F401
+        except ImportError:
+            print("Streamlit path: skipped, Streamlit is not installed")
+            return
+        # Users not touched by the API run, through the real script. The
+        # client processes inherit the environment the app reads.
+        os.environ["HAPPINESS_DB"] = path
+        os.environ["HAPPINESS_SCRYPT_N"] = str(SCRYPT_N)
+        latencies, elapsed = run_processes(args.threads, args.threads, args.visits, args.timeout)
+        rerun_rate = report("Streamlit visits", latencies, elapsed, unit="reruns")
+        print(f"visits/s: API {visit_rate:,.0f}, Streamlit {rerun_rate / 2:,.0f} "
+              f"({visit_rate / (rerun_rate / 2):.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
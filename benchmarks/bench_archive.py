@@ -0,0 +1,95 @@
+# Heavy repeat users: every user has finished --cycles cycles and is partway
+# through another. Compares archiving finished cycles into compressed cycles
+# rows (what start_new_cycle does) with keeping all of them as rows in
+# journals: database size, and latency of the queries a journaling rerun makes
+# against the hot table, plus opening one archived cycle.
+#
+#   python benchmarks/bench_archive.py [--users 500] [--cycles 10]
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import content  # noqa: E402
+import db  # noqa: E402
+
+# Entry text drawn from the curriculum's own vocabulary, most common words
+# most often, so it compresses roughly like real writing
+WORDS = sorted({word for day in content.DAYS for text in (day.insight, day.tip, *day.prompts)
+                for word in re.findall(r"[a-z']+", text.lower())})
+WEIGHTS = [1 / (rank + 1) for rank in range(len(WORDS))]
+
+
+def entry(rng):
+    return " ".join(rng.choices(WORDS, WEIGHTS, k=rng.randint(40, 200)))
+
+
+def build(path, users, cycles, archive):
+    conn = db.connect(path)
+    db.migrate(conn)
+    rng = random.Random(3)
+    raw = 0
+    for n in range(users):
+        email = f"user{n}@example.com"
+        db.create_user(conn, email, "x", "21:00", "2026-01-01")
+        for cycle in range(cycles + 1):
+            days = 21 if cycle < cycles else 10
+            # Without the archive, older cycles' rows stay in journals under
+            # later day numbers
+            offset = 0 if archive else 21 * cycle
+            rows = [(email, f"2026-01-{day:02d}", entry(rng), offset + day) for day in range(1, days + 1)]
+            if cycle < cycles:
+                raw += sum(len(row[2].encode()) for row in rows)
+            with db.transaction(conn):
+                conn.executemany(db.SQL_INSERT_ENTRY, rows)
+            if archive and cycle < cycles:
+                db.start_new_cycle(conn, email, "2026-02-01")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.execute("VACUUM")
+    return conn, raw
+
+
+def timed(fn, samples):
+    start = time.perf_counter()
+    for args in samples:
+        fn(*args)
+    return (time.perf_counter() - start) / len(samples) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--cycles", type=int, default=10, help="finished cycles per user")
+    parser.add_argument("--queries", type=int, default=5000)
+    args = parser.parse_args()
+
+    rng = random.Random(5)
+    emails = [f"user{rng.randrange(args.users)}@example.com" for _ in range(args.queries)]
+    print(f"{args.users} users x {args.cycles} finished cycles + 10 days of the current one")
+    print(f"{'layout':<10} {'size MB':>8} {'journals':>9} {'entry us':>9} {'history us':>11} {'search us':>10}")
+    for archive in (False, True):
+        with tempfile.TemporaryDirectory() as tmp:
+            conn, raw = build(os.path.join(tmp, "bench.db"), args.users, args.cycles, archive)
+            size = os.path.getsize(os.path.join(tmp, "bench.db")) / 2 ** 20
+            rows = conn.execute("SELECT COUNT(*) FROM journals").fetchone()[0]
+            current = 21 * args.cycles + 10 if not archive else 10
+            entry_us = timed(lambda email: db.get_entry(conn, email, current), [(e,) for e in emails])
+            history_us = timed(lambda email: db.get_entry_previews(conn, email, None, 11), [(e,) for e in emails])
+            search_us = timed(lambda email: db.search_entries(conn, email, "grat", 11), [(e,) for e in emails])
+            print(f"{'archive' if archive else 'journals':<10} {size:>8.1f} {rows:>9} {entry_us:>9.1f} "
+                  f"{history_us:>11.1f} {search_us:>10.1f}")
+            if archive:
+                archived = conn.execute("SELECT SUM(length(entries)) FROM cycles").fetchone()[0]
+                open_us = timed(lambda email: db.get_archived_entries(conn, email, 1), [(e,) for e in emails])
+                print(f"archived entries: {archived / 2 ** 20:.1f} MB compressed from "
+                      f"{raw / 2 ** 20:.1f} MB of text ({raw / archived:.1f}x); "
+                      f"opening a cycle takes {open_us:.0f} us")
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
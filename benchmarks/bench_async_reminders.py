@@ -0,0 +1,61 @@
+# Load test for the async reminder engine: a slot with 100k synthetic users,
+# sent to a local SMTP stub that temporarily rejects a small share of
+# messages so the retry path is exercised.
+#
+#   python benchmarks/bench_async_reminders.py [--users 100000] [--concurrency 50]
+import argparse
+import asyncio
+import functools
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import async_reminders  # noqa: E402
+import db  # noqa: E402
+from seed_users import insert_users  # noqa: E402
+from smtp_stub import SMTPStub  # noqa: E402
+
+
+def seed(path, users, slot):
+    conn = db.connect(path)
+    db.migrate(conn)
+    with db.transaction(conn):
+        insert_users(conn, ((f"user{i}@example.com", "x", slot, "2026-01-01", i % 21 + 1) for i in range(users)))
+    conn.close()
+
+
+async def run(path, args):
+    stub = await SMTPStub(fail_rate=args.fail_rate, latency=args.latency).start()
+    session = functools.partial(async_reminders.AsyncSMTPSession, "127.0.0.1", stub.port, "", "", False)
+    report = await async_reminders.send_slot("21:00", time.time() + args.deadline, path, args.concurrency,
+                                             args.rate, backoff=0.01, session_factory=session)
+    await stub.stop()
+    return report, stub
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rate", type=float, default=0)
+    parser.add_argument("--fail-rate", type=float, default=0.01)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds the stub waits per message")
+    parser.add_argument("--deadline", type=float, default=60, help="seconds from start")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        seed(path, args.users, "21:00")
+        report, stub = asyncio.run(run(path, args))
+
+    backend = "aiosmtplib" if async_reminders.aiosmtplib else "smtplib in threads"
+    print(f"backend: {backend}, concurrency {args.concurrency}")
+    print(report)
+    print(f"stub delivered={stub.delivered} rejected={stub.rejected}")
+    assert report.sent == stub.delivered
+
+
+if __name__ == "__main__":
+    main()
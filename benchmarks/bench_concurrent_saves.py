@@ -0,0 +1,73 @@
+# Fires many parallel "Save Today's Entry" calls for a single user, the way a
+# double-click or several open tabs would, and checks the result: exactly one
+# row per day and current_day advanced past the highest saved day.
+#
+#   python benchmarks/bench_concurrent_saves.py [--threads 16] [--saves 50]
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db  # noqa: E402
+import stats  # noqa: E402
+
+EMAIL = "racer@example.com"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--saves", type=int, default=50, help="saves per thread")
+    args = parser.parse_args()
+    # Thread n saves days n+1, n+2, ... (wrapping after 21), so together they
+    # only reach every day once threads + saves - 1 >= 21
+    if args.threads + args.saves < 22:
+        parser.error("--threads + --saves must be at least 22 for the saves to cover all 21 days")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        conn = db.connect(path)
+        db.migrate(conn)
+        db.create_user(conn, EMAIL, "x", "21:00", "2026-01-01")
+        pool = db.ConnectionPool(path, size=args.threads)
+        barrier = threading.Barrier(args.threads)
+        errors = []
+
+        def worker(n):
+            barrier.wait()
+            for i in range(args.saves):
+                day = (n + i) % 21 + 1
+                try:
+                    with pool.connection() as c:
+                        db.save_entry(c, EMAIL, "2026-01-01", f"thread {n} save {i}", day)
+                except Exception as e:
+                    errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.threads)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+
+        rows = conn.execute("SELECT day, COUNT(*) FROM journals WHERE email = ? GROUP BY day", (EMAIL,)).fetchall()
+        current_day = db.get_progress(conn, EMAIL)[0]
+        mismatches = list(stats.find_mismatches(conn))
+        pool.close()
+        conn.close()
+
+    total = args.threads * args.saves
+    print(f"{total} saves in {elapsed:.2f}s ({total / elapsed:.0f}/s), {len(errors)} errors")
+    assert not errors, errors[0]
+    assert len(rows) == 21 and all(count == 1 for _, count in rows), rows
+    assert current_day == 22, current_day
+    assert not mismatches, mismatches
+    print("ok: one row per day, no lost day advance, user_stats consistent")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# CPU time and allocations per rerun for the curriculum: rebuilding the
+# 21-dict list literal and formatting the card HTML inline (the old journaling
+# branch) against a lookup into the preloaded content module.
+#
+#   python benchmarks/bench_content.py [--reruns 20000]
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import content  # noqa: E402
+
+# The old code evaluated a list display on every run; compiling the same
+# literal reproduces that work without keeping a second copy of the text here
+LITERAL = compile(repr([
+    {"day": d.day, "principle": d.principle, "insight": d.insight, "tip": d.tip, "prompts": list(d.prompts)}
+    for d in content.DAYS
+]), "<daily_content>", "eval")
+
+
+def rerun_inline(current_day):
+    daily_content = eval(LITERAL)
+    insight = f"""
+            <div class='insight-card'>
+                <h3>{daily_content[current_day - 1]['principle']}</h3>
+                <p><strong>Insight:</strong> {daily_content[current_day - 1]['insight']}</p>
+                <p><strong>Today's Tip:</strong> {daily_content[current_day - 1]['tip']}</p>
+            </div>
+            """
+    prompts = f"""
+            <div class='prompt-section'>
+                <h4>Today's Journal Prompts:</h4>
+                {"".join([f"<p>• {prompt}</p>" for prompt in daily_content[current_day - 1]['prompts']])}
+            </div>
+            """
+    return insight, prompts
+
+
+def rerun_cached(current_day):
+    today = content.get_day(current_day)
+    return today.insight_html, today.prompts_html
+
+
+def measure(fn, reruns):
+    start = time.process_time()
+    for i in range(reruns):
+        fn(i % 21 + 1)
+    cpu = (time.process_time() - start) / reruns * 1e6
+
+    tracemalloc.start()
+    for i in range(200):
+        fn(i % 21 + 1)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return cpu, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reruns", type=int, default=20000)
+    args = parser.parse_args()
+
+    assert rerun_inline(5) == rerun_cached(5)
+    for name, fn in (("inline", rerun_inline), ("cached", rerun_cached)):
+        cpu, peak = measure(fn, args.reruns)
+        print(f"{name:>7}: {cpu:8.2f} us/rerun  peak alloc {peak:>8} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# Reruns per second for a logged-in journaling page: the original
+# connect/close-per-query pattern against the pooled data layer in db.py.
+#
+#   python benchmarks/bench_db_pool.py [--users 500] [--reruns 5000]
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db  # noqa: E402
+from seed_users import insert_users  # noqa: E402
+
+
+def seed(path, users):
+    conn = db.connect(path)
+    db.migrate(conn)
+    with db.transaction(conn):
+        insert_users(conn, ((f"user{i}@example.com", "x", "21:00", "2026-01-01", 12) for i in range(users)))
+        for i in range(users):
+            email = f"user{i}@example.com"
+            for day in range(1, 12):
+                conn.execute(db.SQL_INSERT_ENTRY, (email, "2026-01-01", "grateful " * 40, day))
+    conn.close()
+
+
+# The three reads every logged-in rerun made, each on its own connection
+def rerun_unpooled(path, email):
+    conn = sqlite3.connect(path)
+    conn.execute("SELECT current_day, start_date FROM users WHERE email = ?", (email,)).fetchone()
+    conn.close()
+    conn = sqlite3.connect(path)
+    conn.execute("SELECT entry FROM journals WHERE email = ? AND day = ?", (email, 12)).fetchone()
+    conn.close()
+    conn = sqlite3.connect(path)
+    conn.execute("SELECT day, date, entry FROM journals WHERE email = ? ORDER BY day DESC", (email,)).fetchall()
+    conn.close()
+
+
+def rerun_pooled(pool, email):
+    with pool.connection() as conn:
+        db.get_progress(conn, email)
+    with pool.connection() as conn:
+        db.get_entry(conn, email, 12)
+    with pool.connection() as conn:
+        db.get_past_entries(conn, email)
+
+
+def measure(fn, emails, reruns):
+    start = time.perf_counter()
+    for _ in range(reruns):
+        fn(random.choice(emails))
+    return reruns / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--reruns", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        seed(path, args.users)
+        emails = [f"user{i}@example.com" for i in range(args.users)]
+        pool = db.ConnectionPool(path)
+
+        before = measure(lambda email: rerun_unpooled(path, email), emails, args.reruns)
+        after = measure(lambda email: rerun_pooled(pool, email), emails, args.reruns)
+        pool.close()
+
+    print(f"connect-per-query: {before:10.0f} reruns/s")
+    print(f"pooled:            {after:10.0f} reruns/s  ({after / before:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
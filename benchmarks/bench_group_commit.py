@@ -0,0 +1,98 @@
+# Saves per second with one commit per save (pooled connections, as the app
+# does by default) against the group-commit writer, for many users saving at
+# once. Both are run with synchronous=NORMAL (the pool's setting) and FULL
+# (an fsync on every commit), since the group-commit writer uses FULL.
+#
+#   python benchmarks/bench_group_commit.py [--threads 64] [--saves 50]
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db  # noqa: E402
+import writer  # noqa: E402
+
+ENTRY = "Grateful for a slow breakfast and a walk by the river. " * 4
+
+
+def setup(path, threads):
+    conn = db.connect(path)
+    db.migrate(conn)
+    for n in range(threads):
+        db.create_user(conn, f"user{n}@example.com", "x", "21:00", "2026-01-01")
+    conn.close()
+
+
+def run(threads, saves, save):
+    barrier = threading.Barrier(threads + 1)
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(n):
+        email = f"user{n}@example.com"
+        mine = []
+        barrier.wait()
+        for i in range(saves):
+            start = time.perf_counter()
+            save(email, "2026-01-01", ENTRY, i % 21 + 1)
+            mine.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(mine)
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for t in workers:
+        t.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return len(latencies) / elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=64, help="users saving at once")
+    parser.add_argument("--saves", type=int, default=50, help="saves per user")
+    parser.add_argument("--batch", type=int, default=writer.MAX_BATCH)
+    parser.add_argument("--delay-ms", type=float, default=writer.MAX_DELAY * 1000)
+    args = parser.parse_args()
+
+    print(f"{'mode':<28} {'saves/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for synchronous in ("NORMAL", "FULL"):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.db")
+            setup(path, args.threads)
+            pragmas = db.PRAGMAS
+            db.PRAGMAS = pragmas + (f"PRAGMA synchronous = {synchronous}",)
+            pool = db.ConnectionPool(path, size=args.threads)
+
+            def per_request(email, date, entry, day):
+                with pool.connection() as conn:
+                    db.save_entry(conn, email, date, entry, day)
+
+            rate, p50, p99 = run(args.threads, args.saves, per_request)
+            pool.close()
+            db.PRAGMAS = pragmas
+        print(f"{'commit per save, ' + synchronous:<28} {rate:>9.0f} {p50 * 1e3:>8.2f} {p99 * 1e3:>8.2f}")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.db")
+            setup(path, args.threads)
+            group = writer.GroupCommitWriter(path, max_batch=args.batch, max_delay=args.delay_ms / 1000,
+                                             synchronous=synchronous)
+            rate, p50, p99 = run(args.threads, args.saves, group.save_entry)
+            group.close()
+            conn = db.connect(path)
+            rows = conn.execute("SELECT COUNT(*) FROM journals").fetchone()[0]
+            conn.close()
+        assert rows == args.threads * min(args.saves, 21), rows
+        print(f"{'group commit, ' + synchronous:<28} {rate:>9.0f} {p50 * 1e3:>8.2f} {p99 * 1e3:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# "Your Past Entries" through the real happiness.py, for a heavy user, before
+# and after pagination. "Before" is the same script with the section swapped
+# back to the old full dump (every entry's full text queried and sent on every
+# rerun); "after" is the script as it is, with previews a page at a time kept
+# in session state. Each runs in its own process with AppTest, logs in once,
+# then times reruns that change nothing and reruns caused by typing in the
+# journal box, a widget outside the history fragment.
+#
+# AppTest always re-runs the whole script, which is also what a browser does
+# for a widget outside a fragment, so these are whole-page reruns. Payload is
+# the serialized size of every element the rerun emitted (the page's deltas),
+# and of the past-entry markdown alone. At the default sizes AppTest's own
+# per-run overhead is most of the rerun time; the payload is where the two
+# differ, and the time gap opens up as --words grows.
+#
+#   python benchmarks/bench_history.py [--entries 20] [--words 800] [--reruns 50]
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import db  # noqa: E402
+import passwords  # noqa: E402
+
+APP = os.path.join(ROOT, "happiness.py")
+EMAIL = "heavy@example.com"
+PASSWORD = "correct horse battery staple"
+SCRYPT_N = 2 ** 10
+# The history section as it was before pagination, rendered in place of past_entries()
+FRAGMENT_CALL = "        past_entries()\n"
+FULL_DUMP = """        st.markdown("<h2>Your Past Entries</h2>", unsafe_allow_html=True)
+        with get_store().connection(st.session_state.email) as conn:
+            for day, date, entry in db.get_past_entries(conn, st.session_state.email):
+                st.markdown(f"**Day {day} ({date})**: {entry}")
+"""
+
+
+# A user on day entries + 1 with `entries` long entries behind them
+def setup(path, entries, words):
+    conn = db.connect(path)
+    db.migrate(conn)
+    db.create_user(conn, EMAIL, passwords.hash_password(PASSWORD, n=SCRYPT_N), "21:00", "2026-01-01")
+    for day in range(1, entries + 1):
+        db.save_entry(conn, EMAIL, f"2026-01-{day:02d}", "today I noticed " * (words // 3), day)
+    conn.close()
+
+
+# The app with the full dump in place of the fragment, next to a copy of the
+# stylesheet it loads from its own directory
+def full_dump_script(tmp):
+    with open(APP, encoding="utf-8") as f:
+        source = f.read()
+    if source.count(FRAGMENT_CALL) != 1:
+        raise RuntimeError("can't find the past_entries() call in happiness.py")
+    path = os.path.join(tmp, "happiness_full_dump.py")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(source.replace(FRAGMENT_CALL, FULL_DUMP))
+    shutil.copy(os.path.join(ROOT, "style.css"), tmp)
+    return path
+
+
+def elements(node):
+    children = getattr(node, "children", None)
+    if children:
+        for child in children.values():
+            yield from elements(child)
+    elif getattr(node, "proto", None) is not None:
+        yield node
+
+
+# (bytes of every element, bytes of the past-entry markdown) in the last run
+def payload(at):
+    total = history = 0
+    for element in elements(at._tree):
+        size = len(element.proto.SerializeToString())
+        total += size
+        if element.type == "markdown" and element.value.startswith("**Day "):
+            history += size
+    return total, history
+
+
+def timed_runs(at, reruns, action=None):
+    samples = []
+    for n in range(reruns):
+        if action is not None:
+            action(n)
+        start = time.perf_counter()
+        at.run()
+        samples.append(time.perf_counter() - start)
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+    total, history = payload(at)
+    return {"p50_ms": round(statistics.median(samples) * 1e3, 2), "bytes": total, "history_bytes": history}
+
+
+def measure(script, reruns, timeout):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(script, default_timeout=timeout)
+    at.run()
+    at.radio[0].set_value("Login")
+    at.text_input[0].input(EMAIL)
+    at.text_input[1].input(PASSWORD)
+    at.button[0].click()
+    at.run()
+    if at.exception or not at.session_state.logged_in:
+        raise RuntimeError(f"could not log in: {[e.message for e in at.exception]}")
+    return {"rerun": timed_runs(at, reruns),
+            "typing": timed_runs(at, reruns, lambda n: at.text_area[0].input(f"draft {n}"))}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entries", type=int, default=20, help="past entries, at most 20 so the cycle is unfinished")
+    parser.add_argument("--words", type=int, default=800, help="words per entry")
+    parser.add_argument("--reruns", type=int, default=50, help="timed reruns per case")
+    parser.add_argument("--timeout", type=float, default=30, help="seconds allowed per app rerun")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if not 1 <= args.entries <= 20:
+        parser.error("--entries must be between 1 and 20")
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.reruns, args.timeout)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        setup(path, args.entries, args.words)
+        env = dict(os.environ, HAPPINESS_DB=path, HAPPINESS_SCRYPT_N=str(SCRYPT_N))
+        results = {}
+        # One process each: AppTest sets up a process-wide Streamlit runtime
+        for label, script in (("full dump", full_dump_script(tmp)), ("paginated", APP)):
+            proc = subprocess.run([sys.executable, __file__, "--child", script, "--reruns", str(args.reruns),
+                                   "--timeout", str(args.timeout)], env=env, capture_output=True, text=True)
+            if proc.returncode:
+                sys.exit(f"{label}: {proc.stderr.strip().splitlines()[-1]}")
+            results[label] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    print(f"{args.entries} entries of {args.words} words, {args.reruns} reruns per case")
+    print(f"{'':<10} {'case':<8} {'p50 ms':>8} {'page bytes':>11} {'history bytes':>14}")
+    for label, cases in results.items():
+        for case, r in cases.items():
+            print(f"{label:<10} {case:<8} {r['p50_ms']:>8.2f} {r['bytes']:>11} {r['history_bytes']:>14}")
+
+
+if __name__ == "__main__":
+    main()
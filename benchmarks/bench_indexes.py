@@ -0,0 +1,58 @@
+# Hot-query latency as the journals table grows, before and after the
+# (email, day) index migration. Each user has 21 entries.
+#
+#   python benchmarks/bench_indexes.py [--sizes 1000,10000,100000,1000000]
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db  # noqa: E402
+
+
+def seed(conn, rows):
+    users = max(1, rows // 21)
+    with db.transaction(conn):
+        conn.execute("""INSERT INTO users (email, password, journal_time, start_date, current_day)
+                        WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i + 1 < ?)
+                        SELECT 'user' || i || '@example.com', 'x', '21:00', '2026-01-01', 21 FROM n""", (users,))
+        conn.execute("""INSERT INTO journals (email, date, entry, day)
+                        WITH RECURSIVE d(day) AS (SELECT 1 UNION ALL SELECT day + 1 FROM d WHERE day < 21)
+                        SELECT email, '2026-01-01', 'grateful for the small things', day FROM users, d""")
+    return users
+
+
+def time_queries(conn, users, samples=300):
+    emails = [f"user{random.randrange(users)}@example.com" for _ in range(samples)]
+    start = time.perf_counter()
+    for email in emails:
+        db.get_entry(conn, email, 7)
+        db.get_past_entries(conn, email)
+    return (time.perf_counter() - start) / samples * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000")
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'no index (us)':>14} {'indexed (us)':>13}")
+    for rows in map(int, args.sizes.split(",")):
+        with tempfile.TemporaryDirectory() as tmp:
+            conn = db.connect(os.path.join(tmp, "bench.db"))
+            with db.transaction(conn):
+                db.MIGRATIONS[0](conn)
+                conn.execute("PRAGMA user_version = 1")
+            users = seed(conn, rows)
+            before = time_queries(conn, users, samples=min(300, max(20, 3_000_000 // rows)))
+            db.migrate(conn)
+            after = time_queries(conn, users)
+            conn.close()
+        print(f"{users * 21:>10} {before:>14.1f} {after:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
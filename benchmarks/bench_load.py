@@ -0,0 +1,314 @@
+# Load test: many users going through the whole journey at once - sign up,
+# log in, load the day, save the entry (advancing through all 21 days), open
+# the completion dashboard and start a new cycle - against a temporary
+# database. Reports p50/p95/p99 latency and throughput for each step, and how
+# many steps failed with "database is locked".
+#
+#   python benchmarks/bench_load.py data [--processes 4] [--threads 16] [--users 2000]
+#   python benchmarks/bench_load.py app  [--processes 4] [--users 200]
+#
+# "data" drives db.py directly with the same statements the app issues; "app"
+# runs the real happiness.py for each user through Streamlit's AppTest, so it
+# includes script reruns and widget handling. Pass --out to save the results
+# as JSON, and --baseline to compare against an earlier run's JSON.
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import content  # noqa: E402
+import db  # noqa: E402
+import passwords  # noqa: E402
+
+APP = os.path.join(ROOT, "happiness.py")
+PASSWORD = "correct horse battery staple"
+ENTRY = ("Today I was grateful for a long walk in the sun, a phone call with an old friend "
+         "and a quiet cup of tea before bed. ") * 3
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(Counter)
+
+    def step(self, name, fn, *args):
+        start = time.perf_counter()
+        try:
+            result = fn(*args)
+        except sqlite3.OperationalError as e:
+            self._error(name, "locked" if "locked" in str(e) else type(e).__name__)
+            return None
+        except Exception as e:
+            self._error(name, type(e).__name__)
+            return None
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.latencies[name].append(elapsed)
+        return result
+
+    def _error(self, name, kind):
+        with self._lock:
+            self.errors[name][kind] += 1
+
+    def merge(self, latencies, errors):
+        for name, values in latencies.items():
+            self.latencies[name].extend(values)
+        for name, counts in errors.items():
+            self.errors[name].update(counts)
+
+
+# One user's journey straight through db.py, issuing what the app's reruns do
+def data_journey(pool, recorder, email, days, cycles):
+    today = date.today().isoformat()
+
+    def signup():
+        with pool.connection() as conn:
+            db.create_user(conn, email, "x", "21:00", today)
+
+    def login():
+        with pool.connection() as conn:
+            return db.get_login(conn, email)
+
+    def load_day(day):
+        with pool.connection() as conn:
+            db.get_progress(conn, email)
+            db.get_entry(conn, email, day)
+            db.get_entry_previews(conn, email)
+
+    def save(day):
+        with pool.connection() as conn:
+            db.save_entry(conn, email, today, ENTRY, day)
+
+    def dashboard():
+        with pool.connection() as conn:
+            db.get_user_stats(conn, email) or db.refresh_user_stats(conn, email)
+
+    def new_cycle():
+        with pool.connection() as conn:
+            db.start_new_cycle(conn, email, today)
+
+    recorder.step("signup", signup)
+    recorder.step("login", login)
+    for cycle in range(cycles):
+        for day in range(1, days + 1):
+            recorder.step("load_day", load_day, day)
+            recorder.step("save", save, day)
+        recorder.step("dashboard", dashboard)
+        if cycle < cycles - 1:
+            recorder.step("new_cycle", new_cycle)
+
+
+# The same journey through the real script, one AppTest per user. Each step
+# is a click plus the rerun it triggers.
+def app_journey(recorder, email, days, cycles, timeout):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP, default_timeout=timeout)
+
+    def run(action=None):
+        if action is not None:
+            action()
+        at.run()
+        for exception in at.exception:
+            if "locked" in exception.message:
+                raise sqlite3.OperationalError(exception.message)
+            raise RuntimeError(exception.message)
+
+    def submit(choice):
+        at.radio[0].set_value(choice)
+        at.text_input[0].input(email)
+        at.text_input[1].input(PASSWORD)
+        at.selectbox[0].select("21:00")
+        at.button[0].click()
+
+    def save():
+        at.text_area[0].input(ENTRY)
+        at.button(key="save_entry").click()
+
+    recorder.step("load_app", run)
+    recorder.step("signup", run, lambda: submit("Sign Up"))
+    recorder.step("login", run, lambda: submit("Login"))
+    if not at.session_state.logged_in:
+        recorder.errors["login"]["rejected"] += 1
+        return
+    for cycle in range(cycles):
+        for day in range(1, days + 1):
+            recorder.step("load_day", run, at.button(key="view_insight").click)
+            recorder.step("save", run, save)
+        if days >= content.TOTAL_DAYS and cycle < cycles - 1:
+            recorder.step("new_cycle", run, at.button(key="new_cycle").click)
+
+
+# Runs one process's share of the users on `threads` threads
+def run_users(mode, path, first, count, threads, args):
+    db.DB_PATH = os.environ["HAPPINESS_DB"] = path
+    recorder = Recorder()
+    pool = db.ConnectionPool(path, size=threads) if mode == "data" else None
+
+    def user(n):
+        email = f"load{n}@example.com"
+        if mode == "data":
+            data_journey(pool, recorder, email, args.days, args.cycles)
+        else:
+            app_journey(recorder, email, args.days, args.cycles, args.timeout)
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(user, range(first, first + count)))
+    if pool is not None:
+        pool.close()
+    return dict(recorder.latencies), {name: dict(counts) for name, counts in recorder.errors.items()}
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q / 100 * len(sorted_values)))]
+
+
+def summarize(recorder, elapsed):
+    steps = {}
+    for name in sorted(set(recorder.latencies) | set(recorder.errors)):
+        values = sorted(recorder.latencies.get(name, ()))
+        errors = dict(recorder.errors.get(name, {}))
+        attempts = len(values) + sum(errors.values())
+        steps[name] = {
+            "count": len(values),
+            "per_second": round(len(values) / elapsed, 1),
+            "p50_ms": _ms(percentile(values, 50)),
+            "p95_ms": _ms(percentile(values, 95)),
+            "p99_ms": _ms(percentile(values, 99)),
+            "max_ms": _ms(values[-1] if values else None),
+            "errors": errors,
+            "locked_rate": round(errors.get("locked", 0) / attempts, 5) if attempts else 0,
+        }
+    total = sum(step["count"] for step in steps.values())
+    locked = sum(step["errors"].get("locked", 0) for step in steps.values())
+    failed = sum(sum(step["errors"].values()) for step in steps.values())
+    return steps, {
+        "elapsed_s": round(elapsed, 3),
+        "steps": total,
+        "steps_per_second": round(total / elapsed, 1),
+        "errors": failed,
+        "locked_rate": round(locked / (total + failed), 5) if total + failed else 0,
+    }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1e3, 3)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(result, baseline=None):
+    base_steps = baseline["steps"] if baseline else {}
+    print(f"{'step':<10} {'count':>8} {'/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7} {'locked':>8}"
+          + ("  p95 vs baseline" if baseline else ""))
+    for name, step in result["steps"].items():
+        line = (f"{name:<10} {step['count']:>8} {step['per_second']:>9.1f} {step['p50_ms'] or 0:>9.2f} "
+                f"{step['p95_ms'] or 0:>9.2f} {step['p99_ms'] or 0:>9.2f} {sum(step['errors'].values()):>7} "
+                f"{step['locked_rate']:>8.2%}")
+        before = base_steps.get(name, {}).get("p95_ms")
+        if before and step["p95_ms"]:
+            line += f"  {(step['p95_ms'] - before) / before:+.0%}"
+        print(line)
+    total = result["total"]
+    print(f"{total['steps']} steps in {total['elapsed_s']:.2f}s ({total['steps_per_second']:.0f}/s), "
+          f"{total['errors']} errors, locked rate {total['locked_rate']:.2%}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("mode", choices=("data", "app"))
+    parser.add_argument("--users", type=int, help="default 2000 for data, 200 for app")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--threads", type=int, help="threads per process in data mode (default 16)")
+    parser.add_argument("--days", type=int, default=content.TOTAL_DAYS, help="days each user saves per cycle")
+    parser.add_argument("--cycles", type=int, default=2)
+    parser.add_argument("--scrypt-n", type=int, default=2 ** 10,
+                        help="password hashing cost for app mode (production default is 16384)")
+    parser.add_argument("--timeout", type=float, default=30, help="seconds allowed per app rerun")
+    parser.add_argument("--db", help="database to use instead of a temporary one")
+    parser.add_argument("--out", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="earlier JSON results to compare p95 against")
+    args = parser.parse_args()
+    users = args.users or (2000 if args.mode == "data" else 200)
+    # AppTest sets up and tears down a process-wide Streamlit runtime, so two
+    # on threads of one process break each other; app mode gets its
+    # concurrency from --processes alone
+    if args.mode == "app" and (args.threads or 1) != 1:
+        parser.error("app mode runs one AppTest per process; use --processes for concurrency")
+    threads = args.threads or (16 if args.mode == "data" else 1)
+    processes = max(1, min(args.processes, users))
+    if args.mode == "app":
+        from streamlit.testing.v1 import AppTest  # noqa: F401  fail before starting workers
+
+    # Inherited by the worker processes, and read by passwords.py when the
+    # app imports it
+    os.environ["HAPPINESS_SCRYPT_N"] = str(args.scrypt_n)
+    passwords.SCRYPT_N = args.scrypt_n
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.db or os.path.join(tmp, "load.db")
+        conn = db.connect(path)
+        db.migrate(conn)
+        conn.close()
+
+        share, extra = divmod(users, processes)
+        batches, first = [], 0
+        for n in range(processes):
+            count = share + (n < extra)
+            batches.append((first, count))
+            first += count
+
+        recorder = Recorder()
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = [executor.submit(run_users, args.mode, path, first, count, threads, args)
+                       for first, count in batches]
+            for future in futures:
+                recorder.merge(*future.result())
+        elapsed = time.perf_counter() - start
+
+    steps, total = summarize(recorder, elapsed)
+    result = {
+        "mode": args.mode,
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(time.time() - elapsed)),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "config": {"users": users, "processes": processes, "threads": threads, "days": args.days,
+                   "cycles": args.cycles, "scrypt_n": args.scrypt_n if args.mode == "app" else None},
+        "steps": steps,
+        "total": total,
+    }
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+# Login verification throughput at each scrypt cost: single-core logins/s,
+# and logins/s through the PasswordHasher pool using every core. Use it to
+# pick HAPPINESS_SCRYPT_N for the expected peak login rate.
+#
+#   python benchmarks/bench_passwords.py [--costs 12,13,14,15,16] [--logins 64]
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import passwords  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--costs", default="12,13,14,15,16", help="log2 of scrypt N")
+    parser.add_argument("--logins", type=int, default=64)
+    args = parser.parse_args()
+
+    workers = os.cpu_count() or 1
+    print(f"{'N':>8} {'ms/login':>9} {'logins/s/core':>14} {f'logins/s x{workers}':>16}")
+    for log_n in map(int, args.costs.split(",")):
+        passwords.SCRYPT_N = 2 ** log_n
+        stored = passwords.hash_password("correct horse battery staple")
+
+        start = time.perf_counter()
+        for _ in range(max(4, args.logins // 4)):
+            assert passwords.verify_password("correct horse battery staple", stored)[0]
+        single = (time.perf_counter() - start) / max(4, args.logins // 4)
+
+        hasher = passwords.PasswordHasher(workers=workers, max_pending=args.logins)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.logins) as callers:
+            list(callers.map(lambda _: hasher.verify("correct horse battery staple", stored), range(args.logins)))
+        pooled = args.logins / (time.perf_counter() - start)
+        hasher.shutdown()
+
+        print(f"{2 ** log_n:>8} {single * 1e3:>9.1f} {1 / single:>14.1f} {pooled:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# Finding who is due a reminder as the user table grows. The same number of
+# users (--due) falls due in every run; the indexed queue (users.next_reminder_at,
+# what `outbox.py schedule` polls) should cost about the same whatever the total,
+# while working out each user's next reminder from journal_time and timezone
+# on every poll has to visit every user.
+#
+#   python benchmarks/bench_reminder_queue.py [--users 100000,300000,1000000] [--due 1000]
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db  # noqa: E402
+
+SLOTS = ("07:00", "12:00", "18:00", "21:00")
+TIMEZONES = ("UTC", "Europe/London", "America/New_York", "America/Los_Angeles", "Asia/Tokyo", "Australia/Sydney")
+SQL_INSERT_USER = """INSERT INTO users (email, password, journal_time, start_date, current_day, timezone,
+                     next_reminder_at) VALUES (?, ?, ?, ?, ?, ?, ?)"""
+# Without the stored column: every user's next reminder, worked out on each poll
+SQL_DUE_BY_SCAN = """SELECT email, journal_time, current_day, timezone FROM users
+                     WHERE next_reminder(journal_time, timezone, current_day, ?, 0) <= ?"""
+
+
+# Users' reminders are spread over the next day, except for `due` of them
+# whose reminder falls in the minute before `now`
+def build(path, users, due, now):
+    conn = db.connect(path)
+    db.migrate(conn)
+    rng = random.Random(11)
+    rows = []
+    with db.transaction(conn):
+        for n in range(users):
+            slot, tz = rng.choice(SLOTS), rng.choice(TIMEZONES)
+            day = rng.randint(1, 21)
+            at = now - rng.randrange(60) if n < due else now + 60 + rng.randrange(86400)
+            rows.append((f"user{n}@example.com", "x", slot, "2026-01-01", day, tz, at))
+            if len(rows) == 10000:
+                conn.executemany(SQL_INSERT_USER, rows)
+                rows = []
+        conn.executemany(SQL_INSERT_USER, rows)
+    conn.execute("ANALYZE")
+    return conn
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", default="100000,300000,1000000", help="comma-separated total user counts")
+    parser.add_argument("--due", type=int, default=1000, help="users due in each run")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    now = int(time.time())
+    print(f"{args.due} users due per poll")
+    print(f"{'users':>9} {'indexed ms':>11} {'scan ms':>9} {'enqueue ms':>11}")
+    for users in map(int, args.users.split(",")):
+        with tempfile.TemporaryDirectory() as tmp:
+            conn = build(os.path.join(tmp, "bench.db"), users, args.due, now)
+            indexed, rows = timed(lambda: conn.execute(db.SQL_DUE_REMINDERS, (now, users)).fetchall(), args.repeat)
+            assert len(rows) == args.due, len(rows)
+            # The scan computes real reminder times, so how many it finds depends on the clock; only its cost
+            # is comparable
+            scan, _ = timed(lambda: conn.execute(SQL_DUE_BY_SCAN, (now, now)).fetchall(), 1)
+            start = time.perf_counter()
+            queued = db.enqueue_due(conn, now, users)
+            enqueue = time.perf_counter() - start
+            assert queued == args.due and db.next_due(conn) > now, queued
+            conn.close()
+        print(f"{users:>9} {indexed * 1e3:>11.2f} {scan * 1e3:>9.0f} {enqueue * 1e3:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
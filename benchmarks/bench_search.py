@@ -0,0 +1,81 @@
+# Search latency for one user's entries over a large journals table: FTS5
+# MATCH (ranked, with snippets) against LIKE '%term%' scoped to the user's
+# email. The (email, day) index already keeps the scoped LIKE cheap while a
+# user has one cycle of entries; the full-scan LIKE shows the naive cost.
+#
+#   python benchmarks/bench_search.py [--rows 2000000] [--words 40]
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db  # noqa: E402
+from seed_users import insert_users  # noqa: E402
+
+VOCABULARY = [f"w{i}" for i in range(5000)] + [
+    "grateful", "family", "coffee", "walk", "friend", "work", "sleep", "morning", "kindness", "music"]
+
+
+def seed(conn, rows, words):
+    users = max(1, rows // 21)
+    rng = random.Random(1)
+    with db.transaction(conn):
+        insert_users(conn, ((f"user{i}@example.com", "x", "21:00", "2026-01-01", 22) for i in range(users)))
+        conn.executemany(db.SQL_INSERT_ENTRY, (
+            (f"user{i}@example.com", "2026-01-01", " ".join(rng.choices(VOCABULARY, k=words)), day)
+            for i in range(users) for day in range(1, 22)))
+    return users
+
+
+def timed(fn, samples):
+    start = time.perf_counter()
+    for args in samples:
+        fn(*args)
+    return (time.perf_counter() - start) / len(samples) * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2000000)
+    parser.add_argument("--words", type=int, default=40, help="words per entry")
+    parser.add_argument("--samples", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = db.connect(os.path.join(tmp, "bench.db"))
+        # Load the rows before the FTS migration so the index is built in one
+        # pass by its 'rebuild', as it would be for an existing database
+        with db.transaction(conn):
+            for step in db.MIGRATIONS[:db.MIGRATIONS.index(db._create_journals_fts)]:
+                step(conn)
+            conn.execute(f"PRAGMA user_version = {db.MIGRATIONS.index(db._create_journals_fts)}")
+        users = seed(conn, args.rows, args.words)
+        start = time.perf_counter()
+        db.migrate(conn)
+        print(f"indexed {users * 21} rows in {time.perf_counter() - start:.1f}s")
+
+        terms = ["grateful", "coffee", "walk", "w42", "fam"]
+        samples = [(f"user{random.randrange(users)}@example.com", random.choice(terms)) for _ in range(args.samples)]
+
+        def fts(email, term):
+            return db.search_entries(conn, email, term)
+
+        def like(email, term):
+            return conn.execute("SELECT day, date, entry FROM journals WHERE email = ? AND entry LIKE ?",
+                                (email, f"%{term}%")).fetchall()
+
+        def like_unscoped(email, term):
+            return conn.execute("SELECT day, date, entry FROM journals WHERE entry LIKE ? AND +email = ?",
+                                (f"%{term}%", email)).fetchall()
+
+        print(f"FTS5 MATCH:      {timed(fts, samples):8.3f} ms/query")
+        print(f"LIKE (by email): {timed(like, samples):8.3f} ms/query")
+        print(f"LIKE (scan):     {timed(like_unscoped, samples[:5]):8.3f} ms/query")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# Write throughput against the number of shards: several processes save
+# entries for users spread over 1, 2, 4, ... shard files, the way a busy
+# journaling slot does. With one file every save waits for the same write
+# lock; each extra shard adds a lock of its own.
+#
+#   python benchmarks/bench_shards.py [--shards 1,2,4,8] [--processes 8] [--saves 2000]
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db  # noqa: E402
+import shards  # noqa: E402
+
+USERS = 2000
+ENTRY = "Grateful for a slow breakfast and a walk by the river. " * 4
+
+
+def saver(paths, worker, saves):
+    store = shards.ShardedStore(paths, size=1)
+    start = time.perf_counter()
+    for i in range(saves):
+        email = f"user{(worker * saves + i) % USERS}@example.com"
+        with store.connection(email) as conn:
+            db.save_entry(conn, email, "2026-01-01", ENTRY, i % 21 + 1)
+    elapsed = time.perf_counter() - start
+    store.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--shards", default="1,2,4,8")
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--saves", type=int, default=2000, help="saves per process")
+    args = parser.parse_args()
+
+    print(f"{'shards':>6} {'saves/s':>9} {'speedup':>8}")
+    baseline = None
+    for count in map(int, args.shards.split(",")):
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = shards.shard_paths(os.path.join(tmp, "bench.db"), count)
+            store = shards.ShardedStore(paths, size=1)
+            store.migrate()
+            for n in range(USERS):
+                email = f"user{n}@example.com"
+                with store.connection(email) as conn:
+                    db.create_user(conn, email, "x", "21:00", "2026-01-01")
+            store.close()
+
+            start = time.perf_counter()
+            with ProcessPoolExecutor(max_workers=args.processes) as executor:
+                list(executor.map(saver, [paths] * args.processes, range(args.processes),
+                                  [args.saves] * args.processes))
+            rate = args.processes * args.saves / (time.perf_counter() - start)
+        baseline = baseline or rate
+        print(f"{count:>6} {rate:>9.0f} {rate / baseline:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
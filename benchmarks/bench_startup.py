@@ -0,0 +1,191 @@
+# Cold start and rerun cost of the app. Imports happiness.py's modules in
+# fresh interpreters under `python -X importtime` and reports how long each
+# takes, and fails if one of the modules the UI shouldn't load (the email
+# stack, the HTTP server) gets imported. With Streamlit installed it also runs
+# the real script through AppTest: the first run in a process, which pays for
+# the once-per-process setup, then reruns of the login page and of a logged-in
+# journaling page. Pass --out to save the results as JSON, and --baseline to
+# compare against an earlier run's JSON (--tolerance makes a slowdown fail).
+#
+#   python benchmarks/bench_startup.py [--repeat 5] [--reruns 50] [--out run.json] [--baseline run.json]
+import argparse
+import ast
+import importlib.util
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "happiness.py")
+# Only imported on the paths that need them, never on a UI cold start
+LAZY = ("smtplib", "email", "http.server", "ssl", "reminders", "numpy")
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+
+
+# The modules happiness.py imports at the top level, in order
+def app_modules():
+    with open(APP, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    names = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            names.append(node.module)
+    return [name for name in dict.fromkeys(names) if name != "streamlit"]
+
+
+# One fresh interpreter: cumulative import time (us) of each top-level import
+# and the names of every module it loaded
+def import_times(modules):
+    code = f"import {', '.join(modules)}"
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, capture_output=True,
+                          text=True, check=True)
+    times, loaded = {}, set()
+    for match in IMPORT_LINE.finditer(proc.stderr):
+        loaded.add(match[4])
+        if not match[3]:
+            times[match[4]] = int(match[2])
+    return {name: times.get(name, 0) for name in modules}, loaded
+
+
+def measure_imports(repeat):
+    modules = app_modules()
+    best, loaded = {}, set()
+    for _ in range(repeat):
+        times, loaded = import_times(modules)
+        for name, us in times.items():
+            best[name] = min(best.get(name, us), us)
+    lazy = sorted(name for name in loaded if name.split(".")[0] in LAZY or name in LAZY)
+    result = {"modules_ms": {name: round(us / 1e3, 2) for name, us in best.items()},
+              "total_ms": round(sum(best.values()) / 1e3, 2), "lazy_loaded": lazy}
+    if importlib.util.find_spec("streamlit"):
+        result["streamlit_ms"] = round(min(import_times(["streamlit"])[0]["streamlit"]
+                                           for _ in range(repeat)) / 1e3, 2)
+    return result
+
+
+def _timed_runs(at, reruns, action=None):
+    samples = []
+    for _ in range(reruns):
+        if action is not None:
+            action()
+        start = time.perf_counter()
+        at.run()
+        samples.append(time.perf_counter() - start)
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+    samples.sort()
+    return {"p50_ms": round(statistics.median(samples) * 1e3, 2),
+            "p95_ms": round(samples[int(len(samples) * 0.95)] * 1e3, 2)}
+
+
+# The real script through AppTest. Run in a child process so the first run
+# imports the app's modules and sets up its cached resources from scratch.
+def measure_reruns(reruns, timeout):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP, default_timeout=timeout)
+    start = time.perf_counter()
+    at.run()
+    result = {"first_run_ms": round((time.perf_counter() - start) * 1e3, 2),
+              "login_page": _timed_runs(at, reruns)}
+    for choice in ("Sign Up", "Login"):
+        at.radio[0].set_value(choice)
+        at.text_input[0].input("startup@example.com")
+        at.text_input[1].input("correct horse battery staple")
+        at.selectbox[0].select("21:00")
+        at.button[0].click()
+        at.run()
+    if not at.session_state.logged_in:
+        raise RuntimeError("could not log in")
+    result["journal_page"] = _timed_runs(at, reruns, at.button(key="view_insight").click)
+    return result
+
+
+def print_report(result, baseline=None):
+    imports = result["imports"]
+    base = (baseline or {}).get("imports", {})
+
+    def versus(value, before):
+        return f"  {(value - before) / before:+.0%} vs baseline" if before else ""
+
+    print(f"{'module':<12} {'import ms':>10}")
+    for name, ms in imports["modules_ms"].items():
+        print(f"{name:<12} {ms:>10.2f}{versus(ms, base.get('modules_ms', {}).get(name))}")
+    print(f"{'total':<12} {imports['total_ms']:>10.2f}{versus(imports['total_ms'], base.get('total_ms'))}")
+    if "streamlit_ms" in imports:
+        print(f"{'streamlit':<12} {imports['streamlit_ms']:>10.2f}")
+    print("lazy modules loaded: " + (", ".join(imports["lazy_loaded"]) or "none"))
+    runs = result.get("reruns")
+    if runs:
+        base_runs = (baseline or {}).get("reruns") or {}
+        print(f"first run {runs['first_run_ms']:.0f} ms{versus(runs['first_run_ms'], base_runs.get('first_run_ms'))}")
+        for page in ("login_page", "journal_page"):
+            p50 = runs[page]["p50_ms"]
+            print(f"{page.replace('_', ' ')} rerun p50 {p50:.1f} ms, p95 {runs[page]['p95_ms']:.1f} ms"
+                  f"{versus(p50, base_runs.get(page, {}).get('p50_ms'))}")
+    else:
+        print("reruns: skipped, Streamlit is not installed")
+
+
+# What got slower than the baseline by more than `tolerance` (a fraction)
+def regressions(result, baseline, tolerance):
+    pairs = [("import total", result["imports"]["total_ms"], baseline["imports"]["total_ms"])]
+    runs, base_runs = result.get("reruns"), baseline.get("reruns")
+    if runs and base_runs:
+        pairs.append(("first run", runs["first_run_ms"], base_runs["first_run_ms"]))
+        pairs += [(f"{page} p50", runs[page]["p50_ms"], base_runs[page]["p50_ms"])
+                  for page in ("login_page", "journal_page")]
+    return [name for name, value, before in pairs if value > before * (1 + tolerance)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per import measurement")
+    parser.add_argument("--reruns", type=int, default=50, help="timed reruns per page")
+    parser.add_argument("--timeout", type=float, default=30, help="seconds allowed per app rerun")
+    parser.add_argument("--out", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="earlier JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, help="fail if more than this %% slower than the baseline")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure_reruns(args.reruns, args.timeout)))
+        return 0
+
+    result = {"python": sys.version.split()[0], "imports": measure_imports(args.repeat), "reruns": None}
+    if importlib.util.find_spec("streamlit"):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, HAPPINESS_DB=os.path.join(tmp, "startup.db"), HAPPINESS_SCRYPT_N="1024")
+            proc = subprocess.run([sys.executable, __file__, "--child", "--reruns", str(args.reruns),
+                                   "--timeout", str(args.timeout)], env=env, capture_output=True, text=True,
+                                  check=True)
+        result["reruns"] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+
+    failed = bool(result["imports"]["lazy_loaded"])
+    if baseline and args.tolerance is not None:
+        slower = regressions(result, baseline, args.tolerance / 100)
+        if slower:
+            print(f"slower than the baseline by more than {args.tolerance:g}%: {', '.join(slower)}")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,10 @@
+# Bulk user rows for the benchmarks. Only the columns every schema version has
+# are written, so a benchmark can seed before or after any migration and the
+# app's own INSERT (db.SQL_INSERT_USER) is free to grow.
+SQL_INSERT_USER = """INSERT INTO users (email, password, journal_time, start_date, current_day)
+                     VALUES (?, ?, ?, ?, ?)"""
+
+
+# rows are (email, password, journal_time, start_date, current_day)
+def insert_users(conn, rows):
+    conn.executemany(SQL_INSERT_USER, rows)
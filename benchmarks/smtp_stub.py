@@ -0,0 +1,59 @@
+# A minimal in-process SMTP server for the reminder benchmarks. It accepts any
+# sender and recipient, counts delivered messages and can be told to fail a
+# fraction of them with a 451 (temporary) reply.
+import asyncio
+import random
+
+
+class SMTPStub:
+    def __init__(self, fail_rate=0.0, latency=0.0):
+        self.fail_rate = fail_rate
+        self.latency = latency
+        self.delivered = 0
+        self.rejected = 0
+        self.port = None
+        self._server = None
+
+    async def start(self, host="127.0.0.1"):
+        self._server = await asyncio.start_server(self._handle, host, 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        writer.write(b"220 stub ESMTP\r\n")
+        in_data = False
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if in_data:
+                    if line == b".\r\n":
+                        in_data = False
+                        if self.latency:
+                            await asyncio.sleep(self.latency)
+                        if random.random() < self.fail_rate:
+                            self.rejected += 1
+                            writer.write(b"451 try again later\r\n")
+                        else:
+                            self.delivered += 1
+                            writer.write(b"250 queued\r\n")
+                    continue
+                command = line[:4].upper()
+                if command == b"EHLO":
+                    writer.write(b"250-stub\r\n250 8BITMIME\r\n")
+                elif command == b"DATA":
+                    in_data = True
+                    writer.write(b"354 end with .\r\n")
+                elif command == b"QUIT":
+                    writer.write(b"221 bye\r\n")
+                    break
+                else:
+                    writer.write(b"250 ok\r\n")
+                await writer.drain()
+        finally:
+            writer.close()
@@ -0,0 +1,56 @@
+import json
+import os
+from typing import NamedTuple
+
+CONTENT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'content.json')
+
+
+# One day of the 21-day curriculum, with its insight card and prompt list
+# rendered to HTML up front since the content never changes at runtime
+class Day(NamedTuple):
+    day: int
+    principle: str
+    insight: str
+    tip: str
+    prompts: tuple
+    insight_html: str
+    prompts_html: str
+
+
+def _render_insight(item):
+    return f"""
+            <div class='insight-card'>
+                <h3>{item['principle']}</h3>
+                <p><strong>Insight:</strong> {item['insight']}</p>
+                <p><strong>Today's Tip:</strong> {item['tip']}</p>
+            </div>
+            """
+
+
+def _render_prompts(item):
+    return f"""
+            <div class='prompt-section'>
+                <h4>Today's Journal Prompts:</h4>
+                {"".join([f"<p>• {prompt}</p>" for prompt in item['prompts']])}
+            </div>
+            """
+
+
+# Load the curriculum from the JSON data file into an immutable tuple
+def load_days(path=CONTENT_PATH):
+    with open(path, encoding='utf-8') as f:
+        items = json.load(f)
+    return tuple(
+        Day(item['day'], item['principle'], item['insight'], item['tip'], tuple(item['prompts']),
+            _render_insight(item), _render_prompts(item))
+        for item in sorted(items, key=lambda item: item['day'])
+    )
+
+
+# Loaded once per process on first import and shared by every caller
+DAYS = load_days()
+TOTAL_DAYS = len(DAYS)
+
+
+def get_day(day):
+    return DAYS[day - 1]
@@ -0,0 +1,659 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import date as Date, timedelta
+
+import metrics
+import schedule
+
+DB_PATH = os.getenv('HAPPINESS_DB', 'happiness_app.db')
+POOL_SIZE = int(os.getenv('HAPPINESS_DB_POOL_SIZE', '8'))
+COUNT_QUERIES = os.getenv('HAPPINESS_COUNT_QUERIES') == '1'
+
+# Applied to every pooled connection. WAL lets readers run alongside the single
+# writer, and NORMAL sync is durable in WAL mode except on power loss.
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA mmap_size = 134217728",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+)
+
+# Fixed queries. Keeping them as module constants means sqlite3's per-connection
+# statement cache hands back the already prepared statement on every call.
+SQL_CREATE_USERS = '''CREATE TABLE IF NOT EXISTS users (
+                 email TEXT PRIMARY KEY,
+                 password TEXT,
+                 journal_time TEXT,
+                 start_date TEXT,
+                 current_day INTEGER
+                 )'''
+SQL_CREATE_JOURNALS = '''CREATE TABLE IF NOT EXISTS journals (
+                 id INTEGER PRIMARY KEY AUTOINCREMENT,
+                 email TEXT,
+                 date TEXT,
+                 entry TEXT,
+                 day INTEGER,
+                 FOREIGN KEY(email) REFERENCES users(email)
+                 )'''
+SQL_INSERT_USER = """INSERT INTO users (email, password, journal_time, start_date, current_day, timezone,
+                     next_reminder_at) VALUES (?, ?, ?, ?, ?, ?, ?)"""
+SQL_USER_LOGIN = "SELECT password, current_day FROM users WHERE email = ?"
+SQL_UPDATE_PASSWORD = "UPDATE users SET password = ? WHERE email = ?"
+SQL_USER_PROGRESS = "SELECT current_day, start_date, version, timezone FROM users WHERE email = ?"
+SQL_USER_VERSION = "SELECT version FROM users WHERE email = ?"
+SQL_ENTRY_FOR_DAY = "SELECT entry FROM journals WHERE email = ? AND day = ?"
+SQL_PAST_ENTRIES = "SELECT day, date, entry FROM journals WHERE email = ? ORDER BY day DESC"
+SQL_ENTRY_PREVIEWS = """SELECT day, date, substr(entry, 1, ?), length(entry) FROM journals
+                        WHERE email = ? AND day < ? ORDER BY day DESC LIMIT ?"""
+SQL_INSERT_ENTRY = "INSERT INTO journals (email, date, entry, day) VALUES (?, ?, ?, ?)"
+SQL_UPSERT_ENTRY = """INSERT INTO journals (email, date, entry, day, words, saved_at)
+                      VALUES (?, ?, ?, ?, ?, CAST(strftime('%s', 'now') AS INTEGER))
+                      ON CONFLICT (email, day) DO UPDATE SET date = excluded.date, entry = excluded.entry,
+                      words = excluded.words, saved_at = excluded.saved_at"""
+SQL_ADVANCE_DAY = """UPDATE users SET current_day = MAX(current_day, ?), version = version + 1,
+                     next_reminder_at = next_reminder(journal_time, timezone, MAX(current_day, ?), ?, 1)
+                     WHERE email = ? RETURNING version"""
+SQL_USERS_IN_SLOT = """SELECT email, journal_time, current_day FROM users
+                       WHERE journal_time = ? AND current_day <= ? ORDER BY email"""
+SQL_ENQUEUE_SLOT = """INSERT OR IGNORE INTO outbox (email, send_date, slot, day)
+                      SELECT email, ?, journal_time, current_day FROM users
+                      WHERE journal_time = ? AND current_day <= ?"""
+SQL_CLAIM_OUTBOX = """UPDATE outbox SET status = 'claimed', claimed_by = ?, claimed_at = ?, attempts = attempts + 1
+                      WHERE id IN (SELECT id FROM outbox
+                                   WHERE (status = 'pending' AND (retry_at IS NULL OR retry_at <= ?))
+                                      OR (status = 'claimed' AND claimed_at < ? AND attempts < ?)
+                                   ORDER BY id LIMIT ?)
+                      RETURNING id, email, slot, day"""
+SQL_EXPIRE_OUTBOX = """UPDATE outbox SET status = 'failed', claimed_by = NULL,
+                                         error = 'lease expired after ' || attempts || ' attempts'
+                       WHERE status = 'claimed' AND claimed_at < ? AND attempts >= ?"""
+SQL_MARK_SENT = """UPDATE outbox SET status = 'sent', sent_at = ?, error = NULL
+                   WHERE id = ? AND status = 'claimed' AND claimed_by = ?"""
+SQL_MARK_FAILED = """UPDATE outbox SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                                       claimed_by = NULL, error = ?, retry_at = ? + ? * (1 << (attempts - 1))
+                     WHERE id = ? AND status = 'claimed' AND claimed_by = ?"""
+SQL_REQUEUE_OUTBOX = """UPDATE outbox SET status = 'pending', attempts = 0, retry_at = NULL
+                        WHERE status = 'failed' AND send_date = ?"""
+SQL_OUTBOX_COUNTS = "SELECT status, COUNT(*) FROM outbox WHERE send_date = ? GROUP BY status"
+SQL_GET_STATS = """SELECT entry_count, total_words, day_words, current_streak, longest_streak, last_entry_date
+                   FROM user_stats WHERE email = ?"""
+SQL_PUT_STATS = """INSERT OR REPLACE INTO user_stats
+                   (email, entry_count, total_words, day_words, current_streak, longest_streak, last_entry_date)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)"""
+SQL_DELETE_STATS = "DELETE FROM user_stats WHERE email = ?"
+SQL_DAY_ENTRIES = "SELECT day, entry FROM journals WHERE email = ?"
+SQL_ENTRY_DATES = "SELECT DISTINCT date FROM journals WHERE email = ? ORDER BY date"
+# Ranked by how many times the query terms occur in the entry. bm25() is not
+# used because its document frequencies cover every user's rows, which makes
+# prefix queries cost as much as the whole corpus.
+SQL_SEARCH_ENTRIES = """SELECT day, date, snip FROM (
+                            SELECT j.day, j.date, snippet(journals_fts, 0, '**', '**', '…', 16) AS snip,
+                                   highlight(journals_fts, 0, char(1), '') AS marked
+                            FROM journals_fts JOIN journals j ON j.id = journals_fts.rowid
+                            WHERE journals_fts MATCH ? AND j.email = ?)
+                        ORDER BY length(marked) - length(replace(marked, char(1), '')) DESC, day DESC
+                        LIMIT ? OFFSET ?"""
+SQL_RESET_CYCLE = """UPDATE users SET current_day = 1, start_date = ?, version = version + 1,
+                     next_reminder_at = next_reminder(journal_time, timezone, 1, ?, 0)
+                     WHERE email = ? RETURNING version"""
+SQL_DELETE_ENTRIES = "DELETE FROM journals WHERE email = ?"
+SQL_CYCLE_ENTRIES = "SELECT day, date, entry, words FROM journals WHERE email = ? ORDER BY day"
+SQL_ARCHIVE_CYCLE = """INSERT INTO cycles (email, cycle, start_date, end_date, entry_count, total_words,
+                       longest_streak, entries)
+                       SELECT ?, coalesce(MAX(cycle), 0) + 1, ?, ?, ?, ?, ?, ? FROM cycles WHERE email = ?
+                       RETURNING cycle"""
+SQL_USER_CYCLES = """SELECT cycle, start_date, end_date, entry_count, total_words, longest_streak FROM cycles
+                     WHERE email = ? ORDER BY cycle DESC"""
+SQL_ARCHIVED_ENTRIES = "SELECT entries FROM cycles WHERE email = ? AND cycle = ?"
+SQL_DUE_REMINDERS = """SELECT email, journal_time, current_day, timezone, next_reminder_at FROM users
+                       WHERE next_reminder_at <= ? ORDER BY next_reminder_at LIMIT ?"""
+SQL_QUEUE_REMINDER = "INSERT OR IGNORE INTO outbox (email, send_date, slot, day) VALUES (?, ?, ?, ?)"
+SQL_ADVANCE_REMINDER = "UPDATE users SET next_reminder_at = ? WHERE email = ?"
+SQL_NEXT_DUE = "SELECT MIN(next_reminder_at) FROM users WHERE next_reminder_at IS NOT NULL"
+
+
+# Per-thread count of executed statements, enabled with HAPPINESS_COUNT_QUERIES=1.
+# Each Streamlit script run happens on one thread, so resetting at the top of
+# the script and reading at the bottom gives the queries for that rerun.
+_query_count = threading.local()
+
+
+def _count_query(statement):
+    _query_count.value = getattr(_query_count, 'value', 0) + 1
+
+
+def reset_query_count():
+    _query_count.value = 0
+
+
+def query_count():
+    return getattr(_query_count, 'value', 0)
+
+
+# Open a connection with the tuned pragmas applied. Autocommit mode is used so
+# transactions are always explicit (see transaction()).
+def connect(path=DB_PATH):
+    conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False,
+                           cached_statements=256)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    # next_reminder(journal_time, timezone, current_day, now, skip_today), so
+    # updates can reschedule a reminder in the same statement
+    conn.create_function("next_reminder", 5, schedule.next_reminder_at)
+    if COUNT_QUERIES:
+        conn.set_trace_callback(_count_query)
+    return metrics.instrument_connection(conn)
+
+
+# Run a block inside BEGIN/COMMIT, rolling back on any error
+@contextmanager
+def transaction(conn, mode="DEFERRED"):
+    conn.execute(f"BEGIN {mode}")
+    try:
+        yield conn
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+# A small bounded pool of long-lived connections shared by every session in the
+# process. Connections are opened lazily and handed out one caller at a time.
+class ConnectionPool:
+    def __init__(self, path=DB_PATH, size=POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._opened < self.size:
+                self._opened += 1
+                try:
+                    return connect(self.path)
+                except Exception:
+                    self._opened -= 1
+                    raise
+        return self._idle.get()
+
+    def _release(self, conn):
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    def close(self):
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+                self._opened -= 1
+
+
+# Schema migrations, applied in order. The database's PRAGMA user_version
+# records how many have run, so each one executes exactly once per file.
+def _create_tables(conn):
+    conn.execute(SQL_CREATE_USERS)
+    conn.execute(SQL_CREATE_JOURNALS)
+
+
+def _index_journals_by_day(conn):
+    # Earlier versions could leave several rows for one day; keep the newest
+    conn.execute("""DELETE FROM journals WHERE id NOT IN (
+                        SELECT MAX(id) FROM journals GROUP BY email, day)""")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS journals_email_day ON journals (email, day)")
+
+
+def _index_users_by_slot(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS users_slot ON users (journal_time, current_day, email)")
+
+
+# One row per reminder per (user, date, slot); the unique key makes enqueueing
+# a slot twice a no-op
+def _create_outbox(conn):
+    conn.execute("""CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY,
+                    email TEXT NOT NULL,
+                    send_date TEXT NOT NULL,
+                    slot TEXT NOT NULL,
+                    day INTEGER NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    claimed_by TEXT,
+                    claimed_at REAL,
+                    sent_at REAL,
+                    error TEXT,
+                    UNIQUE (email, send_date, slot)
+                    )""")
+    conn.execute("CREATE INDEX IF NOT EXISTS outbox_status ON outbox (status, id)")
+
+
+# Running totals for the completion dashboard, maintained by save_entry().
+# day_words is a JSON object of day -> word count.
+def _create_user_stats(conn):
+    conn.execute("""CREATE TABLE IF NOT EXISTS user_stats (
+                    email TEXT PRIMARY KEY,
+                    entry_count INTEGER NOT NULL,
+                    total_words INTEGER NOT NULL,
+                    day_words TEXT NOT NULL,
+                    current_streak INTEGER NOT NULL,
+                    longest_streak INTEGER NOT NULL,
+                    last_entry_date TEXT
+                    )""")
+
+
+# Bumped on every change to a user's progress or entries, so cached copies of
+# the profile can be validated with a single primary-key read
+def _add_user_version(conn):
+    conn.execute("ALTER TABLE users ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+
+# Full-text index over entries. It's an external-content table, so the text is
+# only stored once in journals and the triggers keep the index in step with it.
+# owner is hex(email): a single token, so one user's rows can be picked out
+# inside the index rather than by filtering every match afterwards.
+def _create_journals_fts(conn):
+    conn.execute("ALTER TABLE journals ADD COLUMN owner TEXT GENERATED ALWAYS AS (hex(email)) VIRTUAL")
+    conn.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS journals_fts USING fts5(
+                    entry, owner, content = 'journals', content_rowid = 'id',
+                    tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS journals_fts_insert AFTER INSERT ON journals BEGIN
+                        INSERT INTO journals_fts (rowid, entry, owner) VALUES (new.id, new.entry, hex(new.email));
+                    END""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS journals_fts_delete AFTER DELETE ON journals BEGIN
+                        INSERT INTO journals_fts (journals_fts, rowid, entry, owner)
+                        VALUES ('delete', old.id, old.entry, hex(old.email));
+                    END""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS journals_fts_update AFTER UPDATE OF entry, email ON journals BEGIN
+                        INSERT INTO journals_fts (journals_fts, rowid, entry, owner)
+                        VALUES ('delete', old.id, old.entry, hex(old.email));
+                        INSERT INTO journals_fts (rowid, entry, owner) VALUES (new.id, new.entry, hex(new.email));
+                    END""")
+    conn.execute("INSERT INTO journals_fts (journals_fts) VALUES ('rebuild')")
+
+
+# Word count and save time (Unix seconds) of each entry, so the cohort report
+# (analytics.py) can read them without touching the text. Entries saved before
+# this migration have no saved_at.
+def _add_entry_details(conn):
+    conn.execute("ALTER TABLE journals ADD COLUMN words INTEGER")
+    conn.execute("ALTER TABLE journals ADD COLUMN saved_at INTEGER")
+    conn.create_function("count_words", 1, count_words, deterministic=True)
+    conn.execute("UPDATE journals SET words = count_words(entry)")
+
+
+# Finished cycles, one row each. The entries are moved out of journals into a
+# compressed blob, so the hot table only ever holds the current cycle and a
+# user's history costs a few KB per cycle. zlib rather than zstd because it
+# ships with Python.
+def _create_cycles(conn):
+    conn.execute("""CREATE TABLE IF NOT EXISTS cycles (
+                    id INTEGER PRIMARY KEY,
+                    email TEXT NOT NULL,
+                    cycle INTEGER NOT NULL,
+                    start_date TEXT,
+                    end_date TEXT,
+                    entry_count INTEGER NOT NULL,
+                    total_words INTEGER NOT NULL,
+                    longest_streak INTEGER NOT NULL,
+                    entries BLOB NOT NULL,
+                    UNIQUE (email, cycle)
+                    )""")
+
+
+# Per-user timezone and the next reminder time, as Unix seconds (see
+# schedule.py). Existing users get HAPPINESS_TIMEZONE. The partial index only
+# holds users with a reminder pending, and is what the scheduler range-scans.
+def _add_reminder_schedule(conn):
+    conn.execute("ALTER TABLE users ADD COLUMN timezone TEXT")
+    conn.execute("ALTER TABLE users ADD COLUMN next_reminder_at INTEGER")
+    conn.execute("""UPDATE users SET timezone = ?,
+                    next_reminder_at = next_reminder(journal_time, timezone, current_day, ?, 0)""",
+                 (schedule.DEFAULT_TIMEZONE, time.time()))
+    conn.execute("""CREATE INDEX IF NOT EXISTS users_next_reminder ON users (next_reminder_at)
+                    WHERE next_reminder_at IS NOT NULL""")
+
+
+# When a pending reminder that failed to send may be tried again (Unix
+# seconds); NULL means now
+def _add_outbox_retry(conn):
+    conn.execute("ALTER TABLE outbox ADD COLUMN retry_at REAL")
+
+
+MIGRATIONS = (
+    _create_tables,
+    _index_journals_by_day,
+    _index_users_by_slot,
+    _create_outbox,
+    _create_user_stats,
+    _add_user_version,
+    _create_journals_fts,
+    _add_entry_details,
+    _create_cycles,
+    _add_reminder_schedule,
+    _add_outbox_retry,
+)
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+# Bring the schema up to date. Safe to call from several processes at once:
+# the version is re-read under the write lock before anything is applied.
+def migrate(conn):
+    if schema_version(conn) >= len(MIGRATIONS):
+        return
+    with transaction(conn, "IMMEDIATE"):
+        version = schema_version(conn)
+        for step in MIGRATIONS[version:]:
+            step(conn)
+        conn.execute(f"PRAGMA user_version = {len(MIGRATIONS)}")
+
+
+def create_user(conn, email, password_hash, journal_time, start_date, timezone=None):
+    timezone = timezone or schedule.DEFAULT_TIMEZONE
+    with transaction(conn):
+        conn.execute(SQL_INSERT_USER, (email, password_hash, journal_time, start_date, 1, timezone,
+                                       schedule.next_reminder_at(journal_time, timezone, 1, time.time())))
+
+
+def get_login(conn, email):
+    return conn.execute(SQL_USER_LOGIN, (email,)).fetchone()
+
+
+def update_password(conn, email, password_hash):
+    with transaction(conn):
+        conn.execute(SQL_UPDATE_PASSWORD, (password_hash, email))
+
+
+def get_progress(conn, email):
+    return conn.execute(SQL_USER_PROGRESS, (email,)).fetchone()
+
+
+def get_user_version(conn, email):
+    row = conn.execute(SQL_USER_VERSION, (email,)).fetchone()
+    return row[0] if row else None
+
+
+def get_entry(conn, email, day):
+    row = conn.execute(SQL_ENTRY_FOR_DAY, (email, day)).fetchone()
+    return row[0] if row else None
+
+
+def get_past_entries(conn, email):
+    return conn.execute(SQL_PAST_ENTRIES, (email,)).fetchall()
+
+
+# One page of entries, newest first, starting below `before_day`. Only the first
+# `preview_chars` of each entry are read; the full length is returned so the
+# caller knows whether there is more to show.
+def get_entry_previews(conn, email, before_day=None, limit=10, preview_chars=200):
+    if before_day is None:
+        before_day = 2 ** 31
+    return conn.execute(SQL_ENTRY_PREVIEWS, (preview_chars, email, before_day, limit)).fetchall()
+
+
+# Write (or rewrite) the entry for a day and move the user on, as one write
+# transaction. Progress only ever moves forward, so a stale tab re-saving an
+# earlier day cannot roll current_day back. Saving day 21 moves the user to 22,
+# which marks the cycle complete. Returns the user's new version.
+def save_entry(conn, email, date, entry, day):
+    with transaction(conn, "IMMEDIATE"):
+        return write_entry(conn, email, date, entry, day)
+
+
+# The statements of save_entry(), for callers that already hold a write
+# transaction (see writer.py)
+def write_entry(conn, email, date, entry, day):
+    words = count_words(entry)
+    conn.execute(SQL_UPSERT_ENTRY, (email, date, entry, day, words))
+    version = conn.execute(SQL_ADVANCE_DAY, (day + 1, day + 1, time.time(), email)).fetchone()[0]
+    _record_entry_stats(conn, email, date, day, words)
+    return version
+
+
+def count_words(entry):
+    return len(entry.split())
+
+
+class UserStats:
+    def __init__(self, entry_count=0, total_words=0, day_words=None, current_streak=0, longest_streak=0,
+                 last_entry_date=None):
+        self.entry_count = entry_count
+        self.total_words = total_words
+        self.day_words = day_words if day_words is not None else {}
+        self.current_streak = current_streak
+        self.longest_streak = longest_streak
+        self.last_entry_date = last_entry_date
+
+    @property
+    def avg_words(self):
+        return round(self.total_words / self.entry_count) if self.entry_count else 0
+
+    @classmethod
+    def from_row(cls, row):
+        entry_count, total_words, day_words, current_streak, longest_streak, last_entry_date = row
+        return cls(entry_count, total_words, {int(day): words for day, words in json.loads(day_words).items()},
+                   current_streak, longest_streak, last_entry_date)
+
+    def to_row(self, email):
+        return (email, self.entry_count, self.total_words, json.dumps(self.day_words, separators=(",", ":")),
+                self.current_streak, self.longest_streak, self.last_entry_date)
+
+    # A save on `date`: same day keeps the streak, the next calendar day extends
+    # it, anything later starts a new one
+    def record_save(self, date):
+        if self.last_entry_date is None or date > _next_day(self.last_entry_date):
+            self.current_streak = 1
+        elif date == _next_day(self.last_entry_date):
+            self.current_streak += 1
+        else:
+            return
+        self.last_entry_date = date
+        self.longest_streak = max(self.longest_streak, self.current_streak)
+
+
+def _next_day(iso_date):
+    return (Date.fromisoformat(iso_date) + timedelta(days=1)).isoformat()
+
+
+# Fold one save into the user's stats row. Without a row (entries written
+# before user_stats existed, or the first save of a cycle) the stats are
+# rebuilt from the journal rows, which already include this save.
+def _record_entry_stats(conn, email, date, day, words):
+    stats = get_user_stats(conn, email)
+    if stats is None:
+        conn.execute(SQL_PUT_STATS, compute_user_stats(conn, email).to_row(email))
+        return
+    stats.total_words += words - stats.day_words.get(day, 0)
+    stats.day_words[day] = words
+    stats.entry_count = len(stats.day_words)
+    stats.record_save(date)
+    conn.execute(SQL_PUT_STATS, stats.to_row(email))
+
+
+def get_user_stats(conn, email):
+    row = conn.execute(SQL_GET_STATS, (email,)).fetchone()
+    return UserStats.from_row(row) if row else None
+
+
+# Rebuild a user's stats from their journal rows. Streaks are rebuilt from the
+# dates currently on the entries, so they can come out shorter than the
+# incrementally kept values when a day has been re-saved later on.
+def compute_user_stats(conn, email):
+    stats = UserStats()
+    for day, entry in conn.execute(SQL_DAY_ENTRIES, (email,)).fetchall():
+        stats.day_words[day] = count_words(entry)
+    stats.entry_count = len(stats.day_words)
+    stats.total_words = sum(stats.day_words.values())
+    for (date,) in conn.execute(SQL_ENTRY_DATES, (email,)).fetchall():
+        stats.record_save(date)
+    return stats
+
+
+def refresh_user_stats(conn, email):
+    with transaction(conn, "IMMEDIATE"):
+        stats = compute_user_stats(conn, email)
+        conn.execute(SQL_PUT_STATS, stats.to_row(email))
+    return stats
+
+
+# Users with a reminder due in the given journal_time slot, streamed in chunks
+def iter_users_in_slot(conn, journal_time, last_day=21, chunk_size=1000):
+    cursor = conn.execute(SQL_USERS_IN_SLOT, (journal_time, last_day))
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield from rows
+
+
+# Queue a reminder for every user due in a slot on send_date. Returns how many
+# rows were added; users already queued for that date and slot are skipped.
+def enqueue_slot(conn, send_date, journal_time, last_day=21):
+    with transaction(conn, "IMMEDIATE"):
+        return conn.execute(SQL_ENQUEUE_SLOT, (send_date, journal_time, last_day)).rowcount
+
+
+# Atomically claim up to `limit` pending reminders for a worker. Claims older
+# than `lease` seconds are treated as abandoned by a crashed worker and handed
+# out again, unless they have already had max_attempts tries: a message that
+# keeps taking its worker down is marked failed instead of being retried
+# forever.
+def claim_outbox(conn, worker, limit, now, lease=300, max_attempts=5):
+    with transaction(conn, "IMMEDIATE"):
+        conn.execute(SQL_EXPIRE_OUTBOX, (now - lease, max_attempts))
+        return conn.execute(SQL_CLAIM_OUTBOX, (worker, now, now, now - lease, max_attempts, limit)).fetchall()
+
+
+# Record finished sends. Only rows still claimed by this worker are touched,
+# so replaying a result (or one arriving after the lease was lost) is a no-op.
+# A failed send is not handed out again for `backoff` seconds, doubling with
+# each attempt, so a provider outage doesn't use up every attempt at once.
+def mark_outbox(conn, worker, sent_ids, failures, now, max_attempts=5, backoff=60):
+    with transaction(conn, "IMMEDIATE"):
+        conn.executemany(SQL_MARK_SENT, ((now, outbox_id, worker) for outbox_id in sent_ids))
+        conn.executemany(SQL_MARK_FAILED, ((max_attempts, error, now, backoff, outbox_id, worker)
+                                           for outbox_id, error in failures))
+
+
+# Give a day's failed reminders a fresh set of attempts, e.g. once the mail
+# provider is back. Returns how many were requeued.
+def requeue_outbox(conn, send_date):
+    with transaction(conn, "IMMEDIATE"):
+        return conn.execute(SQL_REQUEUE_OUTBOX, (send_date,)).rowcount
+
+
+# Queue an outbox reminder for up to `limit` users whose next_reminder_at has
+# passed, and move each of them on to their following reminder. Returns how
+# many were queued.
+def enqueue_due(conn, now, limit=1000):
+    with transaction(conn, "IMMEDIATE"):
+        rows = conn.execute(SQL_DUE_REMINDERS, (now, limit)).fetchall()
+        conn.executemany(SQL_QUEUE_REMINDER, ((email, schedule.local_date(due, timezone), journal_time, day)
+                                              for email, journal_time, day, timezone, due in rows))
+        conn.executemany(SQL_ADVANCE_REMINDER, ((schedule.next_reminder_at(journal_time, timezone, day, now), email)
+                                                for email, journal_time, day, timezone, _ in rows))
+    return len(rows)
+
+
+# When the earliest pending reminder is due, or None if there are none
+def next_due(conn):
+    return conn.execute(SQL_NEXT_DUE).fetchone()[0]
+
+
+def outbox_counts(conn, send_date):
+    return dict(conn.execute(SQL_OUTBOX_COUNTS, (send_date,)).fetchall())
+
+
+def _fts_phrase(text):
+    return '"' + text.replace('"', '""') + '"'
+
+
+# Turn free text typed by a user into an FTS5 query: every word must appear,
+# the last one as a prefix so results update while typing. Returns None when
+# there is nothing searchable.
+def build_search_query(email, text):
+    words = [word for word in text.split() if any(ch.isalnum() for ch in word)]
+    if not words:
+        return None
+    terms = " ".join(_fts_phrase(word) for word in words) + "*"
+    return f"owner : {email.encode().hex().upper()} AND entry : ({terms})"
+
+
+# Ranked matches for one user as (day, date, highlighted snippet)
+def search_entries(conn, email, text, limit=10, offset=0):
+    query = build_search_query(email, text)
+    if query is None:
+        return []
+    return conn.execute(SQL_SEARCH_ENTRIES, (query, email, limit, offset)).fetchall()
+
+
+def _pack_entries(rows):
+    return zlib.compress(json.dumps(rows, ensure_ascii=False, separators=(",", ":")).encode(), 9)
+
+
+# Move the user's current entries into a new cycles row. Returns the cycle
+# number, or None if there was nothing to archive. Call inside a write
+# transaction.
+def archive_cycle(conn, email):
+    rows = conn.execute(SQL_CYCLE_ENTRIES, (email,)).fetchall()
+    if not rows:
+        return None
+    start_date = conn.execute(SQL_USER_PROGRESS, (email,)).fetchone()[1]
+    stats = get_user_stats(conn, email) or compute_user_stats(conn, email)
+    entries = [(day, date, entry) for day, date, entry, _ in rows]
+    total_words = sum(count_words(entry) if words is None else words for _, _, entry, words in rows)
+    cycle = conn.execute(SQL_ARCHIVE_CYCLE, (email, start_date, max(date for _, date, _ in entries), len(entries),
+                                             total_words, stats.longest_streak, _pack_entries(entries),
+                                             email)).fetchone()[0]
+    conn.execute(SQL_DELETE_ENTRIES, (email,))
+    return cycle
+
+
+# Archived cycles, newest first, as (cycle, start_date, end_date, entry_count,
+# total_words, longest_streak); the entries themselves aren't read
+def get_cycles(conn, email):
+    return conn.execute(SQL_USER_CYCLES, (email,)).fetchall()
+
+
+# The (day, date, entry) rows of one archived cycle
+def get_archived_entries(conn, email, cycle):
+    row = conn.execute(SQL_ARCHIVED_ENTRIES, (email, cycle)).fetchone()
+    if row is None:
+        return []
+    return [tuple(entry) for entry in json.loads(zlib.decompress(row[0]))]
+
+
+# Archive the finished cycle and start the user again from day 1
+def start_new_cycle(conn, email, start_date):
+    with transaction(conn, "IMMEDIATE"):
+        archive_cycle(conn, email)
+        version = conn.execute(SQL_RESET_CYCLE, (start_date, time.time(), email)).fetchone()[0]
+        conn.execute(SQL_DELETE_STATS, (email,))
+    return version
@@ -0,0 +1,270 @@
+# Lightweight instrumentation: phase timings, SQL statement counts/timings and
+# SMTP send latency, exported in the Prometheus text format. Everything is off
+# unless HAPPINESS_METRICS=1; while off, span() and the other hooks are no-ops
+# that cost a function call.
+#
+#   HAPPINESS_METRICS=1                 collect metrics
+#   HAPPINESS_METRICS_PORT=9464         serve them at http://0.0.0.0:9464/metrics
+#   HAPPINESS_METRICS_FILE=path.prom    or write them to a file (e.g. for the
+#                                       node_exporter textfile collector)
+#   HAPPINESS_PROFILE_SLOW_MS=500       cProfile every rerun and dump the ones
+#   HAPPINESS_PROFILE_DIR=profiles      slower than this to .prof files
+import bisect
+import cProfile
+import functools
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+ENABLED = os.getenv('HAPPINESS_METRICS') == '1'
+METRICS_PORT = int(os.getenv('HAPPINESS_METRICS_PORT', '0'))
+METRICS_FILE = os.getenv('HAPPINESS_METRICS_FILE')
+PROFILE_SLOW_MS = float(os.getenv('HAPPINESS_PROFILE_SLOW_MS', '0'))
+PROFILE_DIR = os.getenv('HAPPINESS_PROFILE_DIR', 'profiles')
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._help = {}
+
+    def observe(self, name, labels, value, help_text=""):
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+                self._help.setdefault(name, help_text)
+            histogram.observe(value)
+
+    def inc(self, name, labels, amount=1, help_text=""):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+            self._help.setdefault(name, help_text)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name in sorted({key[0] for key in self._counters}):
+                lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for (metric, labels), value in sorted(self._counters.items()):
+                    if metric == name:
+                        lines.append(f"{name}{_labels(labels)} {value}")
+            for name in sorted({key[0] for key in self._histograms}):
+                lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for (metric, labels), histogram in sorted(self._histograms.items(), key=lambda item: item[0]):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(labels)} {histogram.total}")
+                    lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+REGISTRY = Registry()
+
+
+def observe(name, value, help_text="", **labels):
+    if ENABLED:
+        REGISTRY.observe(name, tuple(sorted(labels.items())), value, help_text)
+
+
+def inc(name, amount=1, help_text="", **labels):
+    if ENABLED:
+        REGISTRY.inc(name, tuple(sorted(labels.items())), amount, help_text)
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+@contextmanager
+def _span(phase):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        REGISTRY.observe("happiness_phase_seconds", (("phase", phase),), time.perf_counter() - start,
+                         "Time spent in each phase of a rerun")
+
+
+# Time a block as one phase of a rerun
+def span(phase):
+    return _span(phase) if ENABLED else _NOOP
+
+
+# Decorator form of span(); leaves the function untouched when disabled
+def timed(phase):
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _span(phase):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+_UPDATE = re.compile(r"\s*UPDATE\s+(\w+)", re.IGNORECASE)
+_TABLE = re.compile(r"\b(?:FROM|INTO|TABLE|ON)\s+(\w+)", re.IGNORECASE)
+_statement_labels = {}
+
+
+# (op, table) labels for a statement, e.g. SELECT/journals; cached per SQL text
+def _statement_label(sql):
+    label = _statement_labels.get(sql)
+    if label is None:
+        words = sql.split(None, 1)
+        op = words[0].upper() if words else ""
+        match = _UPDATE.match(sql) or _TABLE.search(sql)
+        label = (("op", op), ("table", match.group(1).lower() if match else ""))
+        _statement_labels[sql] = label
+    return label
+
+
+# A sqlite3 connection proxy that times every execute()/executemany() (up to
+# the first row; fetching is not included) by operation and table
+class InstrumentedConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def _timed(self, method, sql, args):
+        start = time.perf_counter()
+        try:
+            return method(sql, *args)
+        finally:
+            REGISTRY.observe("happiness_sql_seconds", _statement_label(sql), time.perf_counter() - start,
+                             "SQL statement execution time")
+
+    def execute(self, sql, *args):
+        return self._timed(self._conn.execute, sql, args)
+
+    def executemany(self, sql, *args):
+        return self._timed(self._conn.executemany, sql, args)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def instrument_connection(conn):
+    return InstrumentedConnection(conn) if ENABLED else conn
+
+
+# Serve /metrics from a daemon thread. Returns the server, or None when metrics
+# are disabled or no port is configured. http.server is imported here rather
+# than at the top since it pulls in the email and ssl packages, which would
+# otherwise be loaded by every process that imports db.
+def start_http_server(port=None, host="0.0.0.0"):
+    port = port if port is not None else METRICS_PORT
+    if not ENABLED or not port:
+        return None
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = REGISTRY.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def write_textfile(path=None):
+    path = path or METRICS_FILE
+    if not ENABLED or not path:
+        return
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(REGISTRY.render())
+    os.replace(tmp, path)
+
+
+_rerun = threading.local()
+
+
+# Mark the start of a Streamlit script run. Reruns cut short by st.rerun()
+# never reach finish_rerun(), so a profiler left running from one is stopped
+# here before the next starts.
+def start_rerun():
+    if not ENABLED:
+        return
+    profiler = getattr(_rerun, "profiler", None)
+    if profiler is not None:
+        profiler.disable()
+    _rerun.profiler = None
+    if PROFILE_SLOW_MS:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            _rerun.profiler = profiler
+        except ValueError:
+            # Python 3.12+ allows one active profiler per process
+            pass
+    _rerun.start = time.perf_counter()
+
+
+def finish_rerun():
+    if not ENABLED or not hasattr(_rerun, "start"):
+        return
+    elapsed = time.perf_counter() - _rerun.start
+    REGISTRY.observe("happiness_rerun_seconds", (), elapsed, "Total time of a Streamlit script run")
+    profiler, _rerun.profiler = _rerun.profiler, None
+    if profiler is not None:
+        profiler.disable()
+        if elapsed * 1000 >= PROFILE_SLOW_MS:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            profiler.dump_stats(os.path.join(PROFILE_DIR, f"rerun-{time.strftime('%Y%m%d-%H%M%S')}-"
+                                                          f"{int(elapsed * 1000)}ms.prof"))
+            inc("happiness_slow_reruns_total", help_text="Reruns slower than HAPPINESS_PROFILE_SLOW_MS")
@@ -0,0 +1,165 @@
+# Durable reminder delivery through the outbox table. The scheduler enqueues
+# one row per (user, date, slot); any number of worker processes then claim
+# rows in batches and record each send, so a crashed or restarted run picks
+# up exactly where it stopped:
+#
+#   python outbox.py enqueue --slot 21:00
+#   python outbox.py work --batch 100          # run one or more of these
+#   python outbox.py status
+#   python outbox.py requeue                   # retry today's failed reminders
+#
+# Instead of enqueueing a slot from cron, `python outbox.py schedule` runs
+# continuously and queues each user's reminder when it falls due at their
+# journal_time in their own timezone (users.next_reminder_at).
+#
+# Delivery is at-least-once: a worker that dies after sending but before
+# recording a batch leaves those rows to be re-sent once their lease expires.
+# A failed send waits --backoff seconds before its next attempt, doubling each
+# time, so rows failed by an outage are left pending for a later `work` run.
+import argparse
+import logging
+import os
+import socket
+import time
+from collections import Counter
+from datetime import date
+
+import db
+import metrics
+import reminders
+import shards
+
+log = logging.getLogger(__name__)
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def enqueue(journal_time, send_date=None, db_path=None):
+    store = shards.ShardedStore(shards.shard_paths(db_path), size=1)
+    try:
+        store.migrate()
+        return sum(store.map(db.enqueue_slot, send_date or date.today().isoformat(), journal_time))
+    finally:
+        store.close()
+
+
+# Queue reminders as they fall due, then sleep until the next one is due, or
+# for at most max_sleep seconds so sign-ups and saves made meanwhile (which may
+# bring a reminder forward) are picked up. With once=True, queue what is due
+# now and return how many were queued.
+def run_scheduler(db_path=None, max_sleep=60, batch_size=1000, once=False):
+    store = shards.ShardedStore(shards.shard_paths(db_path), size=1)
+    try:
+        store.migrate()
+        while True:
+            queued = sum(store.map(db.enqueue_due, time.time(), batch_size))
+            if queued:
+                log.info("Queued %d due reminders", queued)
+            if once:
+                return queued
+            upcoming = [due for due in store.map(db.next_due) if due is not None]
+            time.sleep(max(0.0, min([max_sleep] + [due - time.time() for due in upcoming])))
+    finally:
+        store.close()
+
+
+# Claim and send batches until the outbox has nothing left to hand out,
+# working through the shards in turn. Rows whose retry isn't due yet are left
+# alone. Returns (sent, failed) for this worker.
+def work(worker=None, db_path=None, batch_size=100, lease=300, max_attempts=5, backoff=60,
+         session_factory=reminders.SMTPSession):
+    worker = worker or default_worker_id()
+    sent = failed = 0
+    store = shards.ShardedStore(shards.shard_paths(db_path), size=1)
+    try:
+        store.migrate()
+        with session_factory() as session:
+            for pool in store.pools:
+                with pool.connection() as conn:
+                    while True:
+                        rows = db.claim_outbox(conn, worker, batch_size, time.time(), lease, max_attempts)
+                        if not rows:
+                            break
+                        sent_ids, failures = [], []
+                        for outbox_id, email, slot, day in rows:
+                            try:
+                                session.send(reminders.build_message(email, slot, day))
+                                sent_ids.append(outbox_id)
+                            except Exception as e:
+                                failures.append((outbox_id, str(e)))
+                                log.warning("Failed to send reminder to %s: %s", email, e)
+                        db.mark_outbox(conn, worker, sent_ids, failures, time.time(), max_attempts, backoff)
+                        sent += len(sent_ids)
+                        failed += len(failures)
+    finally:
+        store.close()
+    return sent, failed
+
+
+def requeue(send_date=None, db_path=None):
+    store = shards.ShardedStore(shards.shard_paths(db_path), size=1)
+    try:
+        store.migrate()
+        return sum(store.map(db.requeue_outbox, send_date or date.today().isoformat()))
+    finally:
+        store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Queue and deliver journal reminders")
+    parser.add_argument("--db", default=db.DB_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+    enqueue_parser = commands.add_parser("enqueue", help="queue reminders for a slot")
+    enqueue_parser.add_argument("--slot", required=True, help="journal_time to queue, e.g. 21:00")
+    enqueue_parser.add_argument("--date", help="send date (default today)")
+    work_parser = commands.add_parser("work", help="send queued reminders")
+    work_parser.add_argument("--worker-id")
+    work_parser.add_argument("--batch", type=int, default=100)
+    work_parser.add_argument("--lease", type=float, default=300, help="seconds before a claim is abandoned")
+    work_parser.add_argument("--max-attempts", type=int, default=5)
+    work_parser.add_argument("--backoff", type=float, default=60,
+                             help="seconds before retrying a failed send, doubled on each attempt")
+    schedule_parser = commands.add_parser("schedule", help="queue reminders as they fall due")
+    schedule_parser.add_argument("--max-sleep", type=float, default=60,
+                                 help="longest wait between checks, in seconds")
+    schedule_parser.add_argument("--batch", type=int, default=1000)
+    schedule_parser.add_argument("--once", action="store_true", help="queue what is due now and exit")
+    status_parser = commands.add_parser("status", help="count reminders by status")
+    status_parser.add_argument("--date", help="send date (default today)")
+    requeue_parser = commands.add_parser("requeue", help="retry failed reminders with fresh attempts")
+    requeue_parser.add_argument("--date", help="send date (default today)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if args.command == "enqueue":
+        added = enqueue(args.slot, args.date, args.db)
+        log.info("Queued %d reminders for %s", added, args.slot)
+    elif args.command == "schedule":
+        run_scheduler(args.db, args.max_sleep, args.batch, args.once)
+    elif args.command == "work":
+        start = time.perf_counter()
+        sent, failed = work(args.worker_id, args.db, args.batch, args.lease, args.max_attempts, args.backoff)
+        elapsed = time.perf_counter() - start
+        log.info("sent=%d failed=%d in %.2fs (%.1f msg/s)", sent, failed, elapsed, sent / elapsed if elapsed else 0)
+        metrics.inc("happiness_reminders_sent_total", sent, "Reminders sent")
+        metrics.inc("happiness_reminders_failed_total", failed, "Reminders that could not be sent")
+        metrics.write_textfile()
+    elif args.command == "requeue":
+        log.info("Requeued %d failed reminders", requeue(args.date, args.db))
+    else:
+        store = shards.ShardedStore(shards.shard_paths(args.db), size=1)
+        try:
+            store.migrate()
+            counts = Counter()
+            for shard_counts in store.map(db.outbox_counts, args.date or date.today().isoformat()):
+                counts.update(shard_counts)
+            print(dict(counts))
+        finally:
+            store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
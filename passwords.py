@@ -0,0 +1,92 @@
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# scrypt cost. Each login costs roughly 128 * N * R bytes of memory and time
+# proportional to N; see benchmarks/bench_passwords.py for logins/s per core.
+SCRYPT_N = int(os.getenv('HAPPINESS_SCRYPT_N', str(2 ** 14)))
+SCRYPT_R = int(os.getenv('HAPPINESS_SCRYPT_R', '8'))
+SCRYPT_P = int(os.getenv('HAPPINESS_SCRYPT_P', '1'))
+HASH_WORKERS = int(os.getenv('HAPPINESS_HASH_WORKERS', str(os.cpu_count() or 2)))
+HASH_QUEUE = int(os.getenv('HAPPINESS_HASH_QUEUE', '64'))
+
+
+class Overloaded(Exception):
+    pass
+
+
+def _b64(data):
+    return base64.b64encode(data).decode()
+
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=128 * n * r * (p + 1) + 2 ** 20,
+                          dklen=32)
+
+
+# Salted scrypt hash, stored with its parameters so the cost can be raised
+# later without invalidating existing passwords:
+#   scrypt$<n>$<r>$<p>$<salt>$<hash>
+def hash_password(password, n=None, r=None, p=None):
+    n, r, p = n or SCRYPT_N, r or SCRYPT_R, p or SCRYPT_P
+    salt = secrets.token_bytes(16)
+    return f"scrypt${n}${r}${p}${_b64(salt)}${_b64(_scrypt(password, salt, n, r, p))}"
+
+
+# Check a password against a stored hash. Returns (matches, needs_rehash);
+# needs_rehash is set for the old unsalted SHA-256 hashes and for scrypt hashes
+# made with different cost settings. An unknown user (no stored hash) still
+# costs one scrypt run, so response time doesn't reveal which emails exist.
+def verify_password(password, stored):
+    if not stored:
+        _scrypt(password, bytes(16), SCRYPT_N, SCRYPT_R, SCRYPT_P)
+        return False, False
+    if "$" not in stored:
+        matches = hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored)
+        return matches, matches
+    try:
+        scheme, n, r, p, salt, expected = stored.split("$")
+        n, r, p = int(n), int(r), int(p)
+    except ValueError:
+        return False, False
+    if scheme != "scrypt":
+        return False, False
+    actual = _scrypt(password, base64.b64decode(salt), n, r, p)
+    matches = hmac.compare_digest(actual, base64.b64decode(expected))
+    return matches, matches and (n, r, p) != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+
+
+# Runs hashing on a small thread pool (hashlib releases the GIL while it works)
+# so a burst of logins is spread over `workers` cores instead of every script
+# thread hashing at once. At most `max_pending` jobs may be queued or running;
+# a caller that can't get a slot within `wait` seconds gets Overloaded instead
+# of queueing behind the burst.
+class PasswordHasher:
+    def __init__(self, workers=HASH_WORKERS, max_pending=HASH_QUEUE, wait=1.0):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self.wait = wait
+
+    def _submit(self, fn, *args):
+        if not self._slots.acquire(timeout=self.wait):
+            raise Overloaded("too many password checks in progress")
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def hash(self, password):
+        return self._submit(hash_password, password).result()
+
+    def verify(self, password, stored):
+        return self._submit(verify_password, password, stored).result()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
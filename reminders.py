@@ -0,0 +1,177 @@
+# Reminder emails. Run as a script from cron (or any scheduler) once per
+# journal_time slot to send every due user their prompt over a shared SMTP
+# session:
+#
+#   python reminders.py --slot 21:00
+import argparse
+import logging
+import os
+import queue
+import random
+import smtplib
+import threading
+import time
+from email.mime.text import MIMEText
+
+import content
+import db
+import metrics
+import shards
+
+SMTP_HOST = os.getenv('SMTP_HOST', 'smtp.gmail.com')
+SMTP_PORT = int(os.getenv('SMTP_PORT', '587'))
+SMTP_STARTTLS = os.getenv('SMTP_STARTTLS', '1') != '0'
+EMAIL_SENDER = os.getenv('EMAIL_SENDER')
+EMAIL_PASSWORD = os.getenv('EMAIL_PASSWORD')
+APP_URL = os.getenv('APP_URL', 'http://localhost:8501')
+
+log = logging.getLogger(__name__)
+
+
+# Build the Achor-inspired reminder for a user's current day, or None once the
+# 21 days are done
+def build_message(email, journal_time, current_day, sender=None):
+    if current_day > content.TOTAL_DAYS:
+        return None
+    today = content.get_day(current_day)
+    prompt = random.choice(today.prompts)
+    subject = "📝 Daily Happiness Journal Reminder"
+    body = f"Hi! It's time to journal at {journal_time}. Today's focus: {today.principle}\n\nPrompt: {prompt}\n\nLog in to your Happiness App at {APP_URL} to write your entry!"
+
+    msg = MIMEText(body)
+    msg['Subject'] = subject
+    msg['From'] = sender or EMAIL_SENDER
+    msg['To'] = email
+    return msg
+
+
+# A logged-in SMTP connection that is kept open across messages and
+# re-established once if the server drops it mid-run
+class SMTPSession:
+    def __init__(self, host=None, port=None, user=None, password=None, starttls=None, timeout=30):
+        self.host = host or SMTP_HOST
+        self.port = port or SMTP_PORT
+        self.user = user if user is not None else EMAIL_SENDER
+        self.password = password if password is not None else EMAIL_PASSWORD
+        self.starttls = SMTP_STARTTLS if starttls is None else starttls
+        self.timeout = timeout
+        self._server = None
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                server.starttls()
+            if self.user and self.password:
+                server.login(self.user, self.password)
+        except Exception:
+            server.close()
+            raise
+        self._server = server
+
+    def send(self, msg):
+        start = time.perf_counter()
+        if self._server is None:
+            self._connect()
+        try:
+            self._server.send_message(msg)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            self.close()
+            self._connect()
+            self._server.send_message(msg)
+        metrics.observe("happiness_smtp_send_seconds", time.perf_counter() - start, "SMTP send latency")
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                self._server.close()
+            self._server = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class DispatchResult:
+    def __init__(self):
+        self.sent = 0
+        self.failed = 0
+        self.elapsed = 0.0
+
+    @property
+    def rate(self):
+        return self.sent / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return f"sent={self.sent} failed={self.failed} in {self.elapsed:.2f}s ({self.rate:.1f} msg/s)"
+
+
+# Drain the queue over one session until the None sentinel arrives
+def _sender(messages, session_factory, result, lock):
+    sent = failed = 0
+    with session_factory() as session:
+        while True:
+            msg = messages.get()
+            if msg is None:
+                break
+            try:
+                session.send(msg)
+                sent += 1
+            except Exception as e:
+                failed += 1
+                log.warning("Failed to send reminder to %s: %s", msg['To'], e)
+    with lock:
+        result.sent += sent
+        result.failed += failed
+
+
+# Send the reminder to every user due in a journal_time slot. Users are
+# streamed from every shard and their messages queued for `connections`
+# sender threads, each holding one persistent SMTP session for the whole run.
+def dispatch_slot(journal_time, db_path=None, connections=1, queue_size=1000, session_factory=SMTPSession):
+    result = DispatchResult()
+    lock = threading.Lock()
+    messages = queue.Queue(maxsize=queue_size)
+    senders = [threading.Thread(target=_sender, args=(messages, session_factory, result, lock), daemon=True)
+               for _ in range(connections)]
+    start = time.perf_counter()
+    for sender in senders:
+        sender.start()
+
+    store = shards.ShardedStore(shards.shard_paths(db_path), size=1)
+    try:
+        store.migrate()
+        for email, slot, current_day in store.iter_users_in_slot(journal_time, content.TOTAL_DAYS):
+            messages.put(build_message(email, slot, current_day))
+    finally:
+        store.close()
+        for _ in senders:
+            messages.put(None)
+        for sender in senders:
+            sender.join()
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send journal reminders for one time slot")
+    parser.add_argument("--slot", required=True, help="journal_time to send for, e.g. 21:00")
+    parser.add_argument("--db", default=db.DB_PATH)
+    parser.add_argument("--connections", type=int, default=1, help="SMTP sessions to send over")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    result = dispatch_slot(args.slot, args.db, args.connections)
+    log.info("Reminders for %s: %s", args.slot, result)
+    metrics.inc("happiness_reminders_sent_total", result.sent, "Reminders sent")
+    metrics.inc("happiness_reminders_failed_total", result.failed, "Reminders that could not be sent")
+    metrics.write_textfile()
+    return 0 if result.failed == 0 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,56 @@
+# Reminder times. Each user picks a journal_time ("21:00") in their own
+# timezone, and users.next_reminder_at holds the next moment that falls due as
+# Unix seconds (UTC), or NULL once their cycle is finished. It's recomputed on
+# sign-up, on every save and on a new cycle, and advanced by the scheduler as
+# reminders are queued, so finding who is due is a range scan on one index.
+import functools
+import os
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError, available_timezones
+
+# Timezone for users who signed up before timezones were recorded
+DEFAULT_TIMEZONE = os.getenv('HAPPINESS_TIMEZONE', 'UTC')
+
+
+@functools.lru_cache(maxsize=None)
+def zone(name):
+    try:
+        return ZoneInfo(name or DEFAULT_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo("UTC")
+
+
+@functools.lru_cache(maxsize=1)
+def timezones():
+    return sorted(available_timezones())
+
+
+# The next time journal_time comes round in `timezone` after `now` (Unix
+# seconds), or None once the user is past the last day. With skip_today the
+# reminder goes to tomorrow even if today's time hasn't passed, as after a
+# save. The date arithmetic is done on local wall-clock time, so a reminder
+# stays at 21:00 across daylight-saving changes.
+def next_reminder_at(journal_time, timezone, current_day, now, skip_today=False, last_day=21):
+    if current_day is None or current_day > last_day:
+        return None
+    try:
+        hour, minute = map(int, journal_time.split(":"))
+    except (AttributeError, ValueError):
+        return None
+    tzinfo = zone(timezone)
+    due = datetime.fromtimestamp(now, tzinfo).replace(tzinfo=None, hour=hour, minute=minute, second=0,
+                                                       microsecond=0)
+    if skip_today or due.replace(tzinfo=tzinfo).timestamp() <= now:
+        due += timedelta(days=1)
+    return int(due.replace(tzinfo=tzinfo).timestamp())
+
+
+# The user's local date at a Unix time, e.g. the day a reminder belongs to
+def local_date(timestamp, timezone):
+    return datetime.fromtimestamp(timestamp, zone(timezone)).date().isoformat()
+
+
+# Today's date for the user: what entries and new cycles are stamped with
+def today(timezone):
+    return local_date(time.time(), timezone)
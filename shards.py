@@ -0,0 +1,272 @@
+# Hash-sharded storage. Every table is keyed by email, so each user's rows can
+# live in one of HAPPINESS_SHARDS database files chosen by a stable hash of
+# their email, and saves by users on different shards no longer queue for the
+# same write lock. With the default of one shard the store is just the single
+# HAPPINESS_DB file.
+#
+# Moving to a different shard count is done with the resharding tool, which
+# copies users while the app keeps running and then catches up:
+#
+#   python shards.py reshard --to 4            # bulk copy; safe to rerun
+#   python shards.py reshard --to 4 --finish   # with the app and workers stopped
+#   HAPPINESS_SHARDS=4 streamlit run happiness.py
+#   python shards.py status
+import argparse
+import hashlib
+import os
+import queue
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+import db
+
+SHARDS = int(os.getenv('HAPPINESS_SHARDS', '1'))
+
+SQL_SHARD_USERS = "SELECT email FROM users ORDER BY email"
+SQL_USER_ROW = """SELECT email, password, journal_time, start_date, current_day, version, timezone, next_reminder_at
+                  FROM users WHERE email = ?"""
+SQL_USER_JOURNALS = "SELECT email, date, entry, day, words, saved_at FROM journals WHERE email = ?"
+SQL_USER_STATS_ROW = "SELECT * FROM user_stats WHERE email = ?"
+SQL_USER_CYCLE_ROWS = """SELECT email, cycle, start_date, end_date, entry_count, total_words, longest_streak, entries
+                         FROM cycles WHERE email = ?"""
+SQL_COPY_USER = """INSERT INTO users (email, password, journal_time, start_date, current_day, version, timezone,
+                   next_reminder_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"""
+SQL_COPY_JOURNAL = "INSERT INTO journals (email, date, entry, day, words, saved_at) VALUES (?, ?, ?, ?, ?, ?)"
+SQL_COPY_CYCLE = """INSERT INTO cycles (email, cycle, start_date, end_date, entry_count, total_words, longest_streak,
+                    entries) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"""
+SQL_COPY_STATS = "INSERT INTO user_stats VALUES (?, ?, ?, ?, ?, ?, ?)"
+SQL_ALL_OUTBOX = """SELECT email, send_date, slot, day, status, attempts, claimed_by, claimed_at, sent_at, error,
+                    retry_at FROM outbox"""
+SQL_COPY_OUTBOX = """INSERT INTO outbox (email, send_date, slot, day, status, attempts, claimed_by, claimed_at,
+                     sent_at, error, retry_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+SQL_COUNT_USERS = "SELECT COUNT(*) FROM users"
+
+
+# The shard files for a base path: the path itself for one shard, otherwise
+# e.g. happiness_app.0-of-4.db ... happiness_app.3-of-4.db. The count is part of
+# the name so files for different shard counts can sit side by side while
+# resharding.
+def shard_paths(base=None, count=None):
+    base = base or db.DB_PATH
+    count = count or SHARDS
+    if count == 1:
+        return [base]
+    root, ext = os.path.splitext(base)
+    return [f"{root}.{n}-of-{count}{ext or '.db'}" for n in range(count)]
+
+
+# Stable across processes and Python versions, unlike hash()
+def shard_index(email, count):
+    return int.from_bytes(hashlib.blake2b(email.encode(), digest_size=8).digest(), "big") % count
+
+
+# One connection pool per shard. Per-user work goes through connection(email);
+# work that spans every user is run on all shards in parallel with map() or
+# iter_all().
+class ShardedStore:
+    def __init__(self, paths=None, size=db.POOL_SIZE):
+        self.paths = paths or shard_paths()
+        self.pools = [db.ConnectionPool(path, size) for path in self.paths]
+        self._executor = ThreadPoolExecutor(max_workers=len(self.pools), thread_name_prefix="shard")
+
+    def __len__(self):
+        return len(self.pools)
+
+    def pool_for(self, email):
+        return self.pools[shard_index(email, len(self.pools))]
+
+    def connection(self, email):
+        return self.pool_for(email).connection()
+
+    def _call(self, pool, fn, args):
+        with pool.connection() as conn:
+            return fn(conn, *args)
+
+    # fn(conn, *args) on every shard at once; results in shard order
+    def map(self, fn, *args):
+        if len(self.pools) == 1:
+            return [self._call(self.pools[0], fn, args)]
+        futures = [self._executor.submit(self._call, pool, fn, args) for pool in self.pools]
+        return [future.result() for future in futures]
+
+    def migrate(self):
+        self.map(db.migrate)
+
+    # Stream the rows of a generator fn(conn, *args) from every shard, read in
+    # parallel. Rows arrive in no particular order across shards.
+    def iter_all(self, fn, *args, chunk_size=1000):
+        if len(self.pools) == 1:
+            with self.pools[0].connection() as conn:
+                yield from fn(conn, *args)
+            return
+        chunks = queue.Queue(maxsize=len(self.pools) * 4)
+        stop = threading.Event()
+
+        def scan(pool):
+            try:
+                with pool.connection() as conn:
+                    rows = fn(conn, *args)
+                    while not stop.is_set():
+                        chunk = list(islice(rows, chunk_size))
+                        if not chunk:
+                            break
+                        chunks.put(chunk)
+            except BaseException as e:
+                chunks.put(e)
+            finally:
+                chunks.put(None)
+
+        for pool in self.pools:
+            self._executor.submit(scan, pool)
+        remaining = len(self.pools)
+        try:
+            while remaining:
+                chunk = chunks.get()
+                if chunk is None:
+                    remaining -= 1
+                elif isinstance(chunk, BaseException):
+                    raise chunk
+                else:
+                    yield from chunk
+        finally:
+            # Unblock scans still running if the caller stopped early
+            stop.set()
+            while remaining:
+                if chunks.get() is None:
+                    remaining -= 1
+
+    def iter_users_in_slot(self, journal_time, last_day=21):
+        return self.iter_all(db.iter_users_in_slot, journal_time, last_day)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        for pool in self.pools:
+            pool.close()
+
+
+def _read_user(conn, email):
+    return (conn.execute(SQL_USER_ROW, (email,)).fetchone(),
+            conn.execute(SQL_USER_JOURNALS, (email,)).fetchall(),
+            conn.execute(SQL_USER_STATS_ROW, (email,)).fetchone(),
+            conn.execute(SQL_USER_CYCLE_ROWS, (email,)).fetchall())
+
+
+def _write_users(conn, users):
+    with db.transaction(conn, "IMMEDIATE"):
+        for user, journals, stats, cycles in users:
+            email = user[0]
+            conn.execute(db.SQL_DELETE_ENTRIES, (email,))
+            conn.execute(db.SQL_DELETE_STATS, (email,))
+            conn.execute("DELETE FROM cycles WHERE email = ?", (email,))
+            conn.execute("DELETE FROM users WHERE email = ?", (email,))
+            conn.execute(SQL_COPY_USER, user)
+            conn.executemany(SQL_COPY_JOURNAL, journals)
+            if stats is not None:
+                conn.execute(SQL_COPY_STATS, stats)
+            conn.executemany(SQL_COPY_CYCLE, cycles)
+
+
+# One pass over the source: copy every user whose row in the target is
+# missing or differs (a save or new cycle bumps users.version). Each user is
+# read inside one transaction so their rows are copied as a consistent set.
+# Returns how many users were copied.
+def copy_changed_users(source, target, batch_size=500):
+    copied = 0
+    for pool in source.pools:
+        with pool.connection() as conn:
+            emails = [email for (email,) in conn.execute(SQL_SHARD_USERS).fetchall()]
+        for start in range(0, len(emails), batch_size):
+            batch = emails[start:start + batch_size]
+            with pool.connection() as conn, db.transaction(conn):
+                users = [_read_user(conn, email) for email in batch]
+            by_shard = {}
+            for user in users:
+                if user[0] is not None:
+                    by_shard.setdefault(shard_index(user[0][0], len(target)), []).append(user)
+            for index, shard_users in by_shard.items():
+                with target.pools[index].connection() as conn:
+                    marks = "?, " * (len(shard_users) - 1) + "?"
+                    current = dict(conn.execute(
+                        f"SELECT email, version || ':' || coalesce(password, '') FROM users WHERE email IN ({marks})",
+                        [user[0][0] for user in shard_users]).fetchall())
+                    changed = [user for user in shard_users
+                               if current.get(user[0][0]) != f"{user[0][5]}:{user[0][1] or ''}"]
+                    if changed:
+                        _write_users(conn, changed)
+                        copied += len(changed)
+    return copied
+
+
+# Replace the targets' outboxes with the source rows. Only done on the final
+# pass, with the workers stopped, since claims don't bump users.version.
+def copy_outbox(source, target):
+    by_shard = [[] for _ in target.pools]
+    for rows in source.map(lambda conn: conn.execute(SQL_ALL_OUTBOX).fetchall()):
+        for row in rows:
+            by_shard[shard_index(row[0], len(target))].append(row)
+    for pool, rows in zip(target.pools, by_shard):
+        with pool.connection() as conn, db.transaction(conn, "IMMEDIATE"):
+            conn.execute("DELETE FROM outbox")
+            conn.executemany(SQL_COPY_OUTBOX, rows)
+    return sum(map(len, by_shard))
+
+
+# Copy from one shard layout to another, repeating passes until one finds
+# nothing left to copy (or max_passes is reached). With finish=True the outbox
+# is copied too; run that once the app and outbox workers are stopped, then
+# switch HAPPINESS_SHARDS to the new count.
+def reshard(base, from_count, to_count, finish=False, max_passes=5, log=print):
+    if from_count == to_count:
+        raise ValueError("source and target shard counts are the same")
+    source = ShardedStore(shard_paths(base, from_count), size=1)
+    target = ShardedStore(shard_paths(base, to_count), size=1)
+    try:
+        source.migrate()
+        target.migrate()
+        for n in range(1, max_passes + 1):
+            copied = copy_changed_users(source, target)
+            log(f"pass {n}: copied {copied} users")
+            if not copied:
+                break
+        if finish:
+            log(f"copied {copy_outbox(source, target)} outbox rows")
+    finally:
+        source.close()
+        target.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or change the database shard layout")
+    parser.add_argument("--db", default=db.DB_PATH, help="base database path")
+    commands = parser.add_subparsers(dest="command", required=True)
+    reshard_parser = commands.add_parser("reshard", help="copy users into a different number of shards")
+    reshard_parser.add_argument("--from", dest="from_count", type=int, default=SHARDS,
+                                help="current shard count (default HAPPINESS_SHARDS)")
+    reshard_parser.add_argument("--to", dest="to_count", type=int, required=True)
+    reshard_parser.add_argument("--finish", action="store_true",
+                                help="final pass with writers stopped; also copies the outbox")
+    reshard_parser.add_argument("--passes", type=int, default=5)
+    status_parser = commands.add_parser("status", help="count users on each shard")
+    status_parser.add_argument("--shards", type=int, default=SHARDS)
+    args = parser.parse_args()
+
+    if args.command == "reshard":
+        reshard(args.db, args.from_count, args.to_count, args.finish, args.passes)
+        if args.finish:
+            print(f"Done; restart with HAPPINESS_SHARDS={args.to_count}")
+        return 0
+    store = ShardedStore(shard_paths(args.db, args.shards), size=1)
+    try:
+        store.migrate()
+        counts = store.map(lambda conn: conn.execute(SQL_COUNT_USERS).fetchone()[0])
+    finally:
+        store.close()
+    for path, count in zip(store.paths, counts):
+        print(f"{path}: {count} users")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
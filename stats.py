@@ -0,0 +1,62 @@
+# Maintenance for the user_stats table that backs the completion dashboard.
+#
+#   python stats.py backfill        # (re)build stats for every user from journals
+#   python stats.py check [--fix]   # compare stored stats with a fresh recompute
+import argparse
+import sys
+
+import db
+import shards
+
+SQL_ALL_EMAILS = "SELECT email FROM users UNION SELECT email FROM journals UNION SELECT email FROM user_stats"
+
+
+def backfill(conn):
+    emails = [email for (email,) in conn.execute(SQL_ALL_EMAILS).fetchall()]
+    for email in emails:
+        db.refresh_user_stats(conn, email)
+    return len(emails)
+
+
+# Yields (email, stored, recomputed) for every user whose stored counts don't
+# match their journal rows. Streaks aren't compared; see compute_user_stats().
+def find_mismatches(conn):
+    for (email,) in conn.execute(SQL_ALL_EMAILS).fetchall():
+        stored = db.get_user_stats(conn, email) or db.UserStats()
+        fresh = db.compute_user_stats(conn, email)
+        if (stored.entry_count, stored.total_words, stored.day_words) != (
+                fresh.entry_count, fresh.total_words, fresh.day_words):
+            yield email, stored, fresh
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill or verify per-user journal statistics")
+    parser.add_argument("--db", default=db.DB_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("backfill", help="recompute stats for every user")
+    check_parser = commands.add_parser("check", help="report users whose stats are out of date")
+    check_parser.add_argument("--fix", action="store_true", help="recompute the mismatched users")
+    args = parser.parse_args()
+
+    store = shards.ShardedStore(shards.shard_paths(args.db), size=1)
+    try:
+        store.migrate()
+        if args.command == "backfill":
+            print(f"Backfilled stats for {sum(store.map(backfill))} users")
+            return 0
+        mismatches = [mismatch for shard in store.map(lambda conn: list(find_mismatches(conn)))
+                      for mismatch in shard]
+        for email, stored, fresh in mismatches:
+            print(f"{email}: stored {stored.entry_count} entries/{stored.total_words} words, "
+                  f"journals have {fresh.entry_count}/{fresh.total_words}")
+            if args.fix:
+                with store.connection(email) as conn:
+                    db.refresh_user_stats(conn, email)
+        print(f"{len(mismatches)} mismatched users")
+        return 1 if mismatches and not args.fix else 0
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+# Group commit for journal saves. A GroupCommitWriter is a background thread
+# that owns one write connection: callers queue their save and wait on a
+# future, and the thread commits whatever has queued up - up to `max_batch`
+# saves, or whatever arrived within `max_delay` seconds of the first - as one
+# transaction. A burst of saves then costs one commit (and with
+# synchronous=FULL, one fsync) per batch instead of one per save, and the
+# caller still only hears back once its entry is committed.
+#
+# Opt in with HAPPINESS_GROUP_COMMIT=1; otherwise saves commit one by one on
+# pooled connections as before.
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import db
+
+GROUP_COMMIT = os.getenv('HAPPINESS_GROUP_COMMIT') == '1'
+MAX_BATCH = int(os.getenv('HAPPINESS_GROUP_COMMIT_BATCH', '64'))
+MAX_DELAY = float(os.getenv('HAPPINESS_GROUP_COMMIT_DELAY_MS', '5')) / 1000
+MAX_PENDING = int(os.getenv('HAPPINESS_GROUP_COMMIT_QUEUE', '1000'))
+
+
+class Overloaded(Exception):
+    pass
+
+
+class GroupCommitWriter:
+    def __init__(self, path=db.DB_PATH, max_batch=MAX_BATCH, max_delay=MAX_DELAY, max_pending=MAX_PENDING,
+                 wait=1.0, synchronous="FULL"):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.wait = wait
+        self._closing = False
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._conn = db.connect(path)
+        # Each batch is one commit, so a full sync per commit is affordable and
+        # makes the acknowledgement durable even across a power loss
+        self._conn.execute(f"PRAGMA synchronous = {synchronous}")
+        self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+        self._thread.start()
+
+    # Queue a save; the future resolves to the user's new version once the
+    # batch holding it has committed. Raises Overloaded if the queue stays full
+    # for `wait` seconds.
+    def submit(self, email, date, entry, day):
+        future = Future()
+        try:
+            self._queue.put((future, (email, date, entry, day)), timeout=self.wait)
+        except queue.Full:
+            raise Overloaded("too many saves waiting to be written") from None
+        return future
+
+    # Same arguments and result as db.save_entry(), minus the connection
+    def save_entry(self, email, date, entry, day):
+        return self.submit(email, date, entry, day).result()
+
+    def _next_batch(self):
+        first = self._queue.get()
+        if first is None:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is None:
+                self._closing = True
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        conn = self._conn
+        while not self._closing:
+            batch = self._next_batch()
+            if not batch:
+                break
+            batch = [(future, args) for future, args in batch if future.set_running_or_notify_cancel()]
+            results = []
+            try:
+                with db.transaction(conn, "IMMEDIATE"):
+                    for future, args in batch:
+                        # A failing save only undoes its own statements
+                        conn.execute("SAVEPOINT save")
+                        try:
+                            results.append((future, db.write_entry(conn, *args), None))
+                        except Exception as e:
+                            conn.execute("ROLLBACK TO save")
+                            results.append((future, None, e))
+                        conn.execute("RELEASE save")
+            except Exception as e:
+                for future, _ in batch:
+                    future.set_exception(e)
+                continue
+            for future, version, error in results:
+                if error is None:
+                    future.set_result(version)
+                else:
+                    future.set_exception(error)
+        conn.close()
+
+    # Commit everything already queued, then stop the thread
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()